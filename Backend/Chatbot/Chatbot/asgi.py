@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Chatbot.settings')
 
 application = get_asgi_application()
+
+# only the server loads this module, manage.py commands never warm up
+from chatapi.utils import start_warm_up  # noqa: E402
+
+start_warm_up()
@@ -71,6 +71,9 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # uvicorn doesn't serve /static/ (admin, Swagger); collectstatic fills
+    # STATIC_ROOT in the image and WhiteNoise serves it from the app
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -121,6 +124,40 @@ DATABASES = {
     }
 }
 
+# Reuse database connections instead of opening one per request. Under ASGI
+# (uvicorn) Django's persistent connections (CONN_MAX_AGE) are tied to worker
+# threads and pile up, so each process keeps a bounded psycopg pool instead;
+# DB_POOL=false falls back to persistent connections for WSGI deployments.
+DB_POOL = os.environ.get('DB_POOL', 'true').lower() == 'true'
+if DB_POOL:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'max_lifetime': int(os.environ.get('DB_CONN_MAX_LIFETIME', 30 * 60)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# SQLAlchemy engine shared by every phi component (vector db, agent memory and
+# storage), see chatapi.db.get_engine
+SQLALCHEMY_DATABASE_URL = os.environ.get(
+    'SQLALCHEMY_DATABASE_URL',
+    'postgresql+psycopg://{USER}:{PASSWORD}@{HOST}:{PORT}/{NAME}'.format(**DATABASES['default']),
+)
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 10)),
+    'pool_timeout': float(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', 30)),
+    # drop connections older than this and test each one before use, so a
+    # Postgres restart or an idle timeout in between costs a reconnect, not an error
+    'pool_recycle': int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', 30 * 60)),
+    'pool_pre_ping': True,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -139,12 +176,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Users resolved from JWTs (and verified Basic credentials) are kept in an
+# in-process cache for this long; saving or deleting a user drops its entry.
+# 0 disables the cache. Basic auth is off unless AUTH_BASIC_ENABLED=true.
+AUTH_USER_CACHE_SECONDS = int(os.environ.get('AUTH_USER_CACHE_SECONDS', 60))
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000))
+AUTH_BASIC_ENABLED = os.environ.get('AUTH_BASIC_ENABLED', 'false').lower() == 'true'
+
+# Google sign-in: ID tokens are verified locally against Google's signing
+# certificates, cached per their Cache-Control and refreshed in the
+# background REFRESH_MARGIN seconds before they expire. Point the URL at
+# "python manage.py fake_google_certs" to test without Google.
+GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', os.environ.get('VITE_GOOGLE_CLIENT_ID', ''))
+GOOGLE_CERTS_URL = os.environ.get('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_CERTS_REFRESH_MARGIN = int(os.environ.get('GOOGLE_CERTS_REFRESH_MARGIN', 300))
+GOOGLE_CLOCK_SKEW_SECONDS = int(os.environ.get('GOOGLE_CLOCK_SKEW_SECONDS', 10))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [ 
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-    ],
+    ] + (['user.authentication.CachedBasicAuthentication'] if AUTH_BASIC_ENABLED else []),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  
     ]
@@ -169,7 +221,8 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = '/static/'
-STATIC_ROOT = BASE_DIR / 'staticfiles'
+# the image collects to /static, outside the /Chatbot source mount of docker-compose
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -227,6 +280,119 @@ LOGGING = {
 
 AUTH_USER_MODEL = 'user.User'
 
+# Chat pipeline
+# upper bound on OpenAI calls running at once in one ASGI process
+CHAT_MAX_INFLIGHT_LLM_CALLS = int(os.environ.get('CHAT_MAX_INFLIGHT_LLM_CALLS', 64))
+# resident per-conversation agents, idle ones are dropped after CHAT_AGENT_IDLE_SECONDS
+CHAT_AGENT_POOL_SIZE = int(os.environ.get('CHAT_AGENT_POOL_SIZE', 256))
+CHAT_AGENT_IDLE_SECONDS = int(os.environ.get('CHAT_AGENT_IDLE_SECONDS', 900))
+# build the agent components and fill connection pools in a background thread
+# when the web server starts (asgi.py / wsgi.py; manage.py commands skip it);
+# "python manage.py warm_up" does the same in the foreground and reports timings
+CHAT_WARM_UP_ON_STARTUP = os.environ.get('CHAT_WARM_UP_ON_STARTUP', 'false').lower() == 'true'
+# Agent memories and session summaries are updated by a background thread
+# after the answer is sent: questions are batched for CHAT_MEMORY_BATCH_SECONDS
+# and a conversation is re-summarized every CHAT_SUMMARY_EVERY_TURNS turns
+CHAT_MEMORY_UPDATES_IN_BACKGROUND = os.environ.get('CHAT_MEMORY_UPDATES_IN_BACKGROUND', 'true').lower() == 'true'
+CHAT_SUMMARY_EVERY_TURNS = int(os.environ.get('CHAT_SUMMARY_EVERY_TURNS', 4))
+CHAT_MEMORY_BATCH_SECONDS = float(os.environ.get('CHAT_MEMORY_BATCH_SECONDS', 2))
+# /metrics answers 404 until this is set; scrapers send "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Admission control: token buckets per user and for the whole site, kept in
+# the database. A request that finds its bucket empty waits for a token when
+# fewer than *_QUEUE requests are already waiting on it, otherwise gets a 429
+# with Retry-After. The per-user queue caps any one user's share of the wait.
+CHAT_RATE_LIMIT_ENABLED = os.environ.get('CHAT_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+CHAT_USER_REQUESTS_PER_MINUTE = float(os.environ.get('CHAT_USER_REQUESTS_PER_MINUTE', 6))
+CHAT_USER_BURST = int(os.environ.get('CHAT_USER_BURST', 3))
+CHAT_USER_QUEUE = int(os.environ.get('CHAT_USER_QUEUE', 2))
+CHAT_GLOBAL_REQUESTS_PER_MINUTE = float(os.environ.get('CHAT_GLOBAL_REQUESTS_PER_MINUTE', 300))
+CHAT_GLOBAL_BURST = int(os.environ.get('CHAT_GLOBAL_BURST', 30))
+CHAT_GLOBAL_QUEUE = int(os.environ.get('CHAT_GLOBAL_QUEUE', 60))
+
+# Embeddings (text-embedding-3-large, shortened by the API). 1536 is phi's
+# OpenAIEmbedder default, which existing knowledge base tables (vector(1536))
+# were built with, and stays under pgvector's 2000-dimension index limit.
+# After lowering it run "python manage.py vector_index --reencode" to shorten
+# the stored rows; raising it needs the knowledge base re-ingested.
+# EMBEDDING_BACKEND=local swaps in a deterministic offline embedder for benchmarks
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'openai')
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', 1536))
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_MAX_IN_FLIGHT = int(os.environ.get('EMBEDDING_MAX_IN_FLIGHT', 4))
+# 0 disables client-side token budgeting
+EMBEDDING_TOKENS_PER_MINUTE = int(os.environ.get('EMBEDDING_TOKENS_PER_MINUTE', 1000000))
+EMBEDDING_MAX_RETRIES = int(os.environ.get('EMBEDDING_MAX_RETRIES', 6))
+# content-addressed embedding cache: in-process LRU entries + Postgres table
+EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', 4096))
+EMBEDDING_CACHE_PERSIST = os.environ.get('EMBEDDING_CACHE_PERSIST', 'true').lower() == 'true'
+
+# Semantic answer cache, matched on cosine similarity of the question embedding
+CHAT_ANSWER_CACHE_ENABLED = os.environ.get('CHAT_ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+CHAT_ANSWER_CACHE_THRESHOLD = float(os.environ.get('CHAT_ANSWER_CACHE_THRESHOLD', 0.92))
+CHAT_ANSWER_CACHE_TTL = int(os.environ.get('CHAT_ANSWER_CACHE_TTL', 60 * 60 * 24))
+
+# Knowledge base
+KNOWLEDGE_COLLECTION = os.environ.get('KNOWLEDGE_COLLECTION', 'UoK_Data')
+# chunks handed to the agent per knowledge base search
+KNOWLEDGE_NUM_DOCUMENTS = int(os.environ.get('KNOWLEDGE_NUM_DOCUMENTS', 4))
+# "hybrid" merges vector and Postgres full-text search with reciprocal rank
+# fusion over KNOWLEDGE_SEARCH_CANDIDATES rows from each; "vector" or "text" use one
+KNOWLEDGE_SEARCH_MODE = os.environ.get('KNOWLEDGE_SEARCH_MODE', 'hybrid')
+KNOWLEDGE_TEXT_SEARCH_CONFIG = os.environ.get('KNOWLEDGE_TEXT_SEARCH_CONFIG', 'english')
+KNOWLEDGE_SEARCH_CANDIDATES = int(os.environ.get('KNOWLEDGE_SEARCH_CANDIDATES', 20))
+KNOWLEDGE_RRF_K = int(os.environ.get('KNOWLEDGE_RRF_K', 60))
+# post-retrieval: MMR over KNOWLEDGE_MMR_CANDIDATES chunks (lambda 1 = relevance
+# only, 0 = diversity only), then packed into KNOWLEDGE_CONTEXT_TOKENS of prompt
+KNOWLEDGE_MMR_CANDIDATES = int(os.environ.get('KNOWLEDGE_MMR_CANDIDATES', 12))
+KNOWLEDGE_MMR_LAMBDA = float(os.environ.get('KNOWLEDGE_MMR_LAMBDA', 0.5))
+KNOWLEDGE_CONTEXT_TOKENS = int(os.environ.get('KNOWLEDGE_CONTEXT_TOKENS', 1500))
+# Chunking per vector collection, "default" applies to all of them.
+# strategy "token" = chatapi.chunking.TokenChunking, "document" = phi DocumentChunking
+CHUNKING = {
+    'default': {
+        'strategy': 'token',
+        'max_tokens': int(os.environ.get('CHUNK_MAX_TOKENS', 400)),
+        'overlap_tokens': int(os.environ.get('CHUNK_OVERLAP_TOKENS', 50)),
+    },
+    'UoK_Data': {},
+}
+# ANN index per vector collection, "default" applies to all of them.
+# type "hnsw", "ivfflat" or "none"; ef_search/probes are the per-query
+# defaults and can be overridden by callers (python manage.py vector_index)
+VECTOR_INDEX = {
+    'default': {
+        'type': os.environ.get('VECTOR_INDEX_TYPE', 'hnsw'),
+        'm': int(os.environ.get('VECTOR_INDEX_HNSW_M', 16)),
+        'ef_construction': int(os.environ.get('VECTOR_INDEX_HNSW_EF_CONSTRUCTION', 64)),
+        'ef_search': int(os.environ.get('VECTOR_INDEX_HNSW_EF_SEARCH', 40)),
+        # 0 = rows / 1000 (sqrt(rows) past 1M), recomputed on every rebuild
+        'lists': int(os.environ.get('VECTOR_INDEX_IVFFLAT_LISTS', 0)),
+        'probes': int(os.environ.get('VECTOR_INDEX_IVFFLAT_PROBES', 10)),
+        # IVFFlat is rebuilt after ingest once the row count changed this much
+        'rebuild_growth': float(os.environ.get('VECTOR_INDEX_REBUILD_GROWTH', 2)),
+        'maintenance_work_mem': os.environ.get('VECTOR_INDEX_MAINTENANCE_WORK_MEM', '512MB'),
+        # "vector" (4 bytes/dim) or "halfvec" (2 bytes/dim), halfvec needs pgvector >= 0.7.
+        # The knowledge base table is phi's, migrations don't touch it: after
+        # changing this on an existing deployment run
+        # "python manage.py vector_index --reencode"
+        'storage': os.environ.get('VECTOR_STORAGE', 'vector'),
+        # "binary" indexes binary_quantize(embedding) and rescores
+        # rescore_factor * limit candidates by exact distance (pgvector >= 0.7)
+        'quantization': os.environ.get('VECTOR_QUANTIZATION', 'none'),
+        'rescore_factor': int(os.environ.get('VECTOR_RESCORE_FACTOR', 4)),
+    },
+    'UoK_Data': {},
+}
+
+# PDF ingest worker (python manage.py ingest_worker)
+INGEST_WORKER_POLL_SECONDS = float(os.environ.get('INGEST_WORKER_POLL_SECONDS', 2))
+# running jobs not updated for this long are assumed orphaned and requeued
+INGEST_JOB_STALE_SECONDS = int(os.environ.get('INGEST_JOB_STALE_SECONDS', 15 * 60))
+# PDF text extraction: processes (0 = one per core) and pages per task
+INGEST_PDF_WORKERS = int(os.environ.get('INGEST_PDF_WORKERS', 0))
+INGEST_PDF_PAGE_BATCH = int(os.environ.get('INGEST_PDF_PAGE_BATCH', 8))
+
 #Django Allauth
 SITE_ID = 1
 ACCOUNT_LOGIN_METHODS = {"email"}
@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
+from chatapi.views import MetricsView
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -41,4 +42,5 @@ urlpatterns = [
     path('bot/',include('chatapi.urls')),
     path('user/',include('user.urls')),
     path('accounts/',include('allauth.urls')),
+    path('metrics',MetricsView.as_view(), name='metrics'),
 ]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
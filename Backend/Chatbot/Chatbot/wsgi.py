@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Chatbot.settings')
 
 application = get_wsgi_application()
+
+# only the server loads this module, manage.py commands never warm up
+from chatapi.utils import start_warm_up  # noqa: E402
+
+start_warm_up()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UploadRecord,ChatMessage
+from .models import UploadRecord,ChatMessage,CachedAnswer,IngestJob
 
 # Register your models here.
 
@@ -18,4 +18,16 @@ class AdminChatmessage(admin.ModelAdmin):
             short_txt += '...'
         return short_txt
 
-    short_content.short_description = "Content(first 20 words)" 
\ No newline at end of file
+    short_content.short_description = "Content(first 20 words)"
+
+
+@admin.register(CachedAnswer)
+class AdminCachedAnswer(admin.ModelAdmin):
+    list_display = ['id', 'question', 'kb_version', 'hits', 'created_at', 'last_hit_at']
+    exclude = ['embedding']
+
+
+@admin.register(IngestJob)
+class AdminIngestJob(admin.ModelAdmin):
+    list_display = ['id', 'record', 'status', 'chunks_embedded', 'chunks_total', 'failures', 'created_at', 'finished_at']
+    list_filter = ['status']
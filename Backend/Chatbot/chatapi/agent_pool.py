@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class PooledAgent:
+    def __init__(self, agent):
+        self.agent = agent
+        # one run at a time per conversation, the agent keeps per-run state
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class AgentPool:
+    """
+    Keeps one lightweight Agent per (user, conversation) in memory.
+
+    Agents are cheap wrappers, the expensive parts (OpenAI client, knowledge
+    base, memory db and storage) are shared and passed in through ``factory``.
+    Conversation state lives in PgAgentStorage, so an evicted session is just
+    rebuilt from storage on its next request.
+    """
+
+    def __init__(self, factory, max_sessions=256, idle_timeout=900):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, conversation_id):
+        key = (str(user_id), str(conversation_id))
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+
+            entry = self._sessions.get(key)
+            if entry is None:
+                session_id = f"{key[0]}:{key[1]}"
+                entry = PooledAgent(self.factory(user_id=key[0], session_id=session_id))
+                self._sessions[key] = entry
+                self._evict_overflow()
+            else:
+                self._sessions.move_to_end(key)
+
+            entry.last_used = now
+            return entry
+
+    def discard(self, user_id, conversation_id):
+        with self._lock:
+            self._sessions.pop((str(user_id), str(conversation_id)), None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict_idle(self, now):
+        if not self.idle_timeout:
+            return
+        expired = [
+            key for key, entry in self._sessions.items()
+            if now - entry.last_used > self.idle_timeout and not entry.lock.locked()
+        ]
+        for key in expired:
+            del self._sessions[key]
+
+    def _evict_overflow(self):
+        # oldest first; sessions with a run in flight are skipped so two
+        # requests on one conversation never end up with two agents
+        for key in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if not self._sessions[key].lock.locked():
+                del self._sessions[key]
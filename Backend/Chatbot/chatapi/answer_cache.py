@@ -0,0 +1,84 @@
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from pgvector.django import CosineDistance
+from .embedding import fit_dimensions
+from .metrics import cache_lookup
+from .models import ANSWER_CACHE_DIMENSIONS, CachedAnswer, KnowledgeBaseVersion
+
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticAnswerCache:
+    """
+    Serves a stored answer when a new question embeds close enough to one
+    that was already answered against the current knowledge base version.
+    Embeddings are stored at ANSWER_CACHE_DIMENSIONS whatever size the
+    embedder produces.
+    """
+
+    def __init__(self, embedder, threshold=0.92, ttl=60 * 60 * 24):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, question):
+        """Returns (answer or None, question embedding)."""
+        embedding = self.embedder.get_embedding(question)
+        if not embedding:
+            return None, embedding
+        embedding = fit_dimensions(embedding, ANSWER_CACHE_DIMENSIONS)
+
+        match = (
+            CachedAnswer.objects
+            .filter(
+                kb_version=KnowledgeBaseVersion.current(),
+                created_at__gte=timezone.now() - timedelta(seconds=self.ttl),
+            )
+            .annotate(distance=CosineDistance('embedding', embedding))
+            .order_by('distance')
+            .first()
+        )
+
+        if match is None or match.distance > 1 - self.threshold:
+            self._count(hit=False)
+            return None, embedding
+
+        CachedAnswer.objects.filter(pk=match.pk).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+        self._count(hit=True)
+        logger.info("Answer cache hit (similarity %.3f): %s", 1 - match.distance, question[:80])
+        return match.answer, embedding
+
+    def store(self, question, embedding, answer):
+        if not embedding:
+            return
+        CachedAnswer.objects.create(
+            question=question,
+            answer=answer,
+            embedding=fit_dimensions(embedding, ANSWER_CACHE_DIMENSIONS),
+            kb_version=KnowledgeBaseVersion.current(),
+        )
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def _count(self, hit):
+        cache_lookup("answer", hit)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import logging
+import itertools
+from dataclasses import dataclass
+from pathlib import Path
+from django.conf import settings
+from django.test.utils import override_settings
+from .embedding import LocalEmbedder
+from .ingest import build_reader, file_fingerprint, sync_documents
+from .loadtest import minimal_pdf
+from .metrics import percentile
+from .vectordb import build_vector_db
+
+
+logger = logging.getLogger(__name__)
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_data", "retrieval.json")
+
+
+@dataclass(frozen=True)
+class IndexConfig:
+    """What goes into one benchmark table; search modes are compared on the same table."""
+    chunk_tokens: int
+    overlap_tokens: int
+    dimensions: int
+    index: str
+
+    @property
+    def collection(self):
+        return f"bench_{self.chunk_tokens}_{self.overlap_tokens}_{self.dimensions}_{self.index}"
+
+
+def configurations(chunk_tokens, overlap_tokens, dimensions, indexes):
+    return [IndexConfig(*values) for values in itertools.product(chunk_tokens, overlap_tokens, dimensions, indexes)]
+
+
+def normalize(text):
+    return " ".join(text.split()).lower()
+
+
+def load_fixture(path=FIXTURE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_fixture_pdfs(documents, directory):
+    """Renders the fixture documents to PDFs, so they go through the real reader and chunker."""
+    paths = []
+    for document in documents:
+        path = os.path.join(directory, f"{document['name']}.pdf")
+        with open(path, "wb") as f:
+            f.write(minimal_pdf(document["pages"]))
+        paths.append(path)
+    return paths
+
+
+def first_relevant_rank(documents, expected):
+    expected = normalize(expected)
+    for rank, document in enumerate(documents, start=1):
+        if expected in normalize(document.content):
+            return rank
+    return None
+
+
+def evaluate(vector_db, questions, mode, ks=(1, 3, 5), depth=10):
+    """recall@k for every k, MRR over the top ``depth`` results and search latency (ms)."""
+    ranks, latencies = [], []
+    for item in questions:
+        start = time.perf_counter()
+        documents = vector_db.search(item["question"], limit=depth, mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ranks.append(first_relevant_rank(documents, item["expected"]))
+
+    result = {f"recall@{k}": sum(1 for rank in ranks if rank and rank <= k) / len(ranks) for k in ks}
+    result["mrr"] = sum(1 / rank for rank in ranks if rank) / len(ranks)
+    result["p50_ms"] = percentile(latencies, 50)
+    result["p95_ms"] = percentile(latencies, 95)
+    result["misses"] = [item["question"] for item, rank in zip(questions, ranks) if not rank or rank > max(ks)]
+    return result
+
+
+def run_configuration(config, pdf_paths, questions, modes, ks=(1, 3, 5), depth=10, keep=False):
+    """
+    Builds a throwaway collection for ``config`` with the offline
+    LocalEmbedder, ingests the PDFs through the production reader, chunker
+    and index maintenance, then scores every search mode on it.
+    """
+    collection = config.collection
+    chunking = {**settings.CHUNKING, collection: {"max_tokens": config.chunk_tokens,
+                                                  "overlap_tokens": config.overlap_tokens}}
+    indexes = {**settings.VECTOR_INDEX, collection: {"type": config.index}}
+
+    with override_settings(CHUNKING=chunking, VECTOR_INDEX=indexes):
+        vector_db = build_vector_db(collection, embedder=LocalEmbedder(dimensions=config.dimensions))
+        reader = build_reader(collection)
+        if vector_db.table_exists():
+            vector_db.drop()
+        try:
+            start = time.perf_counter()
+            for path in pdf_paths:
+                with open(path, "rb") as f:
+                    content_hash = file_fingerprint(f)
+                sync_documents(vector_db, reader.iter_read(path), Path(path).stem, content_hash)
+            vector_db.maintain_index()
+            ingest_seconds = time.perf_counter() - start
+
+            index = vector_db.index_info()
+            stats = {
+                "collection": collection,
+                "chunk_tokens": config.chunk_tokens,
+                "overlap_tokens": config.overlap_tokens,
+                "dimensions": config.dimensions,
+                "index": config.index,
+                "chunks": vector_db.get_count(),
+                "table_bytes": vector_db.table_size(),
+                "index_bytes": index["size"] if index else 0,
+                "ingest_seconds": ingest_seconds,
+            }
+            return [{**stats, "mode": mode, **evaluate(vector_db, questions, mode, ks, depth)} for mode in modes]
+        finally:
+            if not keep:
+                vector_db.drop()
@@ -0,0 +1,218 @@
+import re
+from functools import lru_cache
+from typing import List
+from django.conf import settings
+from phi.document.base import Document
+from phi.document.chunking.document import DocumentChunking
+from phi.document.chunking.strategy import ChunkingStrategy
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # the BPE file is downloaded on first use, offline boxes fall back
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # without tiktoken: ~4 characters per token for English prose
+    return max(1, len(text) // 4) if text else 0
+
+
+HEADING_RE = re.compile(
+    r"^("
+    r"(?i:chapter|section|part|article|annex|appendix)\b.*"   # Chapter 3 ..., Section B ...
+    r"|\d+(\.\d+)*\.?\s+[A-Z].{0,80}"                         # 2.1 Admission Policy
+    r"|[A-Z][A-Z0-9 &/,()'-]{3,80}"                           # FEE STRUCTURE
+    r")$"
+)
+# three+ columns separated by wide gaps, tabs or pipes
+TABLE_ROW_RE = re.compile(r"(\S+(\s{2,}|\t|\s*\|\s*)){2,}\S+")
+
+
+def is_heading(line):
+    line = line.strip()
+    if not line or len(line) > 90 or line.endswith((".", ",", ";")):
+        return False
+    if line.isupper() and len(line.split()) <= 12:
+        return True
+    return bool(HEADING_RE.match(line))
+
+
+def is_numeric_row(line, min_numbers=3):
+    """A row of numbers and punctuation only, e.g. "01/08/2024 - 15,000 / 12.5%"."""
+    if any(ch.isalpha() or ch == "_" for ch in line):
+        return False
+    numbers = sum(1 for token in line.split() if any(ch.isdigit() for ch in token))
+    return numbers >= min_numbers
+
+
+def is_table_row(line):
+    line = line.strip()
+    return bool(line) and bool(TABLE_ROW_RE.search(line) or is_numeric_row(line))
+
+
+class TokenChunking(ChunkingStrategy):
+    """
+    Token-sized chunks that follow the layout of university PDFs: headings
+    start a new section (and are repeated at the top of every chunk from that
+    section), table rows are kept together and split only between rows with
+    the header row repeated, and prose is packed line by line with a small
+    token overlap.
+    """
+
+    def __init__(self, max_tokens: int = 400, overlap_tokens: int = 50, min_tokens: int = 20):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+
+    def chunk(self, document: Document) -> List[Document]:
+        chunks = []
+        for section, blocks in self.sections(document.content):
+            chunks.extend(self.pack(section, blocks))
+
+        documents = []
+        for number, (section, text) in enumerate(chunks, start=1):
+            meta_data = document.meta_data.copy()
+            meta_data["chunk"] = number
+            meta_data["chunk_tokens"] = count_tokens(text)
+            if section:
+                meta_data["section"] = section
+            chunk_id = f"{document.id or document.name}_{number}" if (document.id or document.name) else None
+            documents.append(Document(id=chunk_id, name=document.name, meta_data=meta_data, content=text))
+        return documents
+
+    def sections(self, text):
+        """Yields (heading, blocks) where a block is ("text"|"table", [lines])."""
+        heading = None
+        blocks = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line.strip():
+                continue
+            table_row = is_table_row(line)
+            if not table_row and is_heading(line):
+                title = " ".join(line.split())
+                if blocks:
+                    yield heading, blocks
+                    heading = title
+                else:
+                    # stacked headings, e.g. a document title over its first section
+                    heading = f"{heading} / {title}" if heading else title
+                blocks = []
+                continue
+            kind = "table" if table_row else "text"
+            if blocks and blocks[-1][0] == kind:
+                blocks[-1][1].append(line)
+            else:
+                blocks.append((kind, [line]))
+        if blocks or heading:
+            yield heading, blocks or [("text", [])]
+
+    def pack(self, section, blocks):
+        prefix = f"{section}\n" if section else ""
+        budget = self.max_tokens - count_tokens(prefix)
+        chunks, current, size = [], [], 0
+
+        def flush():
+            nonlocal current, size
+            body = "\n".join(current).strip()
+            if body:
+                chunks.append((section, prefix + body))
+            current, size = [], 0
+
+        for kind, lines in blocks:
+            if kind == "table":
+                rows = self.table_parts(lines, budget)
+                for part in rows:
+                    part_size = count_tokens(part)
+                    if size and size + part_size > budget:
+                        flush()
+                    current.append(part)
+                    size += part_size
+                continue
+
+            for line in lines:
+                for piece in self.split_long(line, budget):
+                    piece_size = count_tokens(piece)
+                    if size and size + piece_size > budget:
+                        tail = self.overlap(current)
+                        flush()
+                        current = tail
+                        size = sum(count_tokens(item) for item in current)
+                    current.append(piece)
+                    size += piece_size
+        flush()
+
+        # fold a tiny trailing chunk back into its neighbour
+        if len(chunks) > 1 and count_tokens(chunks[-1][1]) < self.min_tokens:
+            tail = chunks.pop()[1][len(prefix):]
+            chunks[-1] = (section, chunks[-1][1] + "\n" + tail)
+        return chunks
+
+    def table_parts(self, rows, budget):
+        """Whole table if it fits, else runs of rows each led by the header row."""
+        table = "\n".join(rows)
+        if count_tokens(table) <= budget:
+            return [table]
+        header, parts, current = rows[0], [], [rows[0]]
+        for row in rows[1:]:
+            if count_tokens("\n".join(current + [row])) > budget and len(current) > 1:
+                parts.append("\n".join(current))
+                current = [header]
+            current.append(row)
+        parts.append("\n".join(current))
+        return parts
+
+    def overlap(self, lines):
+        if not self.overlap_tokens:
+            return []
+        tail, size = [], 0
+        for line in reversed(lines):
+            size += count_tokens(line)
+            if size > self.overlap_tokens:
+                break
+            tail.insert(0, line)
+        return tail
+
+    def split_long(self, line, budget):
+        if count_tokens(line) <= budget:
+            return [line]
+        words, pieces, current = line.split(), [], []
+        for word in words:
+            if current and count_tokens(" ".join(current + [word])) > budget:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+        return pieces
+
+
+def chunking_config(collection):
+    config = dict(settings.CHUNKING.get("default", {}))
+    config.update(settings.CHUNKING.get(collection, {}))
+    return config
+
+
+def chunking_for(collection):
+    """The chunking strategy configured for a vector collection in settings.CHUNKING."""
+    config = chunking_config(collection)
+    strategy = config.pop("strategy", "token")
+    if strategy == "document":
+        return DocumentChunking(**config)
+    if strategy == "token":
+        return TokenChunking(**config)
+    raise ValueError(f"Unknown chunking strategy {strategy!r} for {collection}")
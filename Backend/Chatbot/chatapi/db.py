@@ -0,0 +1,48 @@
+import threading
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from sqlalchemy import create_engine
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(url=None):
+    """
+    The process-wide SQLAlchemy engine for ``url`` (default
+    settings.SQLALCHEMY_DATABASE_URL). phi components otherwise build an
+    engine, and a connection pool, per instance.
+    """
+    url = url or settings.SQLALCHEMY_DATABASE_URL
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url, **settings.SQLALCHEMY_ENGINE_OPTIONS)
+            _engines[url] = engine
+        return engine
+
+
+def dispose_engines():
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def database_sync_to_async(func):
+    """
+    sync_to_async for ORM work on the async chat path. The connection goes
+    back to the pool as soon as ``func`` returns, instead of staying checked
+    out by the request's thread until the streamed response has ended.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run)
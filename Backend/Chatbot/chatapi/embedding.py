@@ -1,14 +1,359 @@
 import os
+import re
+import math
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import openai
+from django.conf import settings
+from django.db import transaction
+from pydantic import PrivateAttr
+from phi.embedder.base import Embedder
 from phi.embedder.openai import OpenAIEmbedder
+from .metrics import cache_lookup, span
+from .models import EmbeddingCache
 
 
 
 open_api_key = os.environ.get("OPENAI_API_KEY")
 
+logger = logging.getLogger(__name__)
 
-openai_embedder = OpenAIEmbedder(
-    model="text-embedding-3-large",
-    api_key=open_api_key,
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
 )
 
 
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def shorten(embedding, dimensions):
+    """Truncates an embedding and scales it back to unit length."""
+    if len(embedding) <= dimensions:
+        return embedding
+    embedding = embedding[:dimensions]
+    norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+    return [x / norm for x in embedding]
+
+
+def fit_dimensions(embedding, dimensions):
+    """
+    Brings an embedding to exactly ``dimensions``: longer ones are shortened,
+    shorter ones zero-padded, which leaves their cosine similarities as is.
+    """
+    if len(embedding) >= dimensions:
+        return shorten(embedding, dimensions)
+    return list(embedding) + [0.0] * (dimensions - len(embedding))
+
+
+def estimate_tokens(text):
+    # close enough for budgeting English text with cl100k-style tokenizers
+    return max(1, len(text) // 4)
+
+
+class TokenBudget:
+    """Token bucket that refills at ``tokens_per_minute``; 0 disables it."""
+
+    def __init__(self, tokens_per_minute=0):
+        self.capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        if not self.capacity:
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) * 60 / self.capacity
+            time.sleep(wait)
+
+
+class EmbeddingExecutor:
+    """
+    Splits texts into API-sized batches and runs them on a bounded thread
+    pool. Callers block until their batches are done, which is what pushes
+    back on the PDF reader during ingest. Rate limits and transient errors
+    are retried with jittered exponential backoff instead of failing the
+    whole upload.
+    """
+
+    def __init__(self, batch_size=64, max_in_flight=4, tokens_per_minute=0,
+                 max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.budget = TokenBudget(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed")
+            return self._pool
+
+    def map(self, embed_batch, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self.call(embed_batch, batches[0])
+        futures = [self.pool.submit(self.call, embed_batch, batch) for batch in batches]
+        return [embedding for future in futures for embedding in future.result()]
+
+    def call(self, embed_batch, batch):
+        self.budget.acquire(sum(estimate_tokens(text) for text in batch))
+        for attempt in range(self.max_retries + 1):
+            try:
+                return embed_batch(batch)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay(e, attempt)
+                logger.warning("Embedding batch failed (%s), retry %d in %.1fs", type(e).__name__, attempt + 1, delay)
+                time.sleep(delay)
+
+    def retry_delay(self, error, attempt):
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+embedding_executor = EmbeddingExecutor(
+    batch_size=settings.EMBEDDING_BATCH_SIZE,
+    max_in_flight=settings.EMBEDDING_MAX_IN_FLIGHT,
+    tokens_per_minute=settings.EMBEDDING_TOKENS_PER_MINUTE,
+    max_retries=settings.EMBEDDING_MAX_RETRIES,
+)
+
+
+class BatchOpenAIEmbedder(OpenAIEmbedder):
+    """
+    OpenAIEmbedder that reuses one client (phi builds a new one per call)
+    and can embed many texts per request through the shared executor.
+    """
+
+    _client = PrivateAttr(default=None)
+    _client_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def client(self):
+        if self.openai_client:
+            return self.openai_client
+        with self._client_lock:
+            if self._client is None:
+                params = {"api_key": self.api_key, "max_retries": 0}
+                if self.base_url:
+                    params["base_url"] = self.base_url
+                params.update(self.client_params or {})
+                self._client = openai.OpenAI(**params)
+            return self._client
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        request = {"input": texts, "model": self.model, "encoding_format": self.encoding_format}
+        if self.model.startswith("text-embedding-3"):
+            request["dimensions"] = self.dimensions
+        response = self.client.embeddings.create(**request)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        response = embedding_executor.call(lambda batch: self.response(text=batch[0]), [text])
+        usage = response.usage.model_dump() if response.usage else None
+        return response.data[0].embedding, usage
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding_and_usage(text)[0]
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return embedding_executor.map(self.embed_batch, texts)
+
+
+class LocalEmbedder(Embedder):
+    """
+    Deterministic, offline embedder using signed feature hashing of words and
+    word pairs. Similar texts land close together, which is enough to run and
+    benchmark the ingest and retrieval pipeline without calling OpenAI.
+    """
+
+    model: str = "local-hash"
+
+    def get_embedding(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = re.findall(r"\w+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        return self.get_embedding(text), None
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self.get_embedding(text) for text in texts]
+
+
+class CachingEmbedder(Embedder):
+    """
+    Wraps another embedder and caches vectors by content hash, first in an
+    in-process LRU and then in the EmbeddingCache table, so unchanged chunks
+    and repeated questions are never sent to the API twice.
+    """
+
+    embedder: Embedder
+    lru_size: int = 4096
+    persist: bool = True
+
+    _lru: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context) -> None:
+        self.dimensions = self.embedder.dimensions
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.embedder, "model", type(self.embedder).__name__)
+
+    def cache_key(self, text: str) -> str:
+        raw = f"{self.model_name}\x00{self.dimensions}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embedding_and_usage(text)[0]
+
+    def get_embedding_and_usage(self, text: str) -> Tuple[List[float], Optional[Dict]]:
+        key = self.cache_key(text)
+
+        embedding = self._lru_get(key)
+        if embedding is not None:
+            cache_lookup("embedding", hit=True)
+            return embedding, None
+
+        embedding = self._db_get([key]).get(key)
+        if embedding is not None:
+            cache_lookup("embedding", hit=True)
+            self._lru_put(key, embedding)
+            return embedding, None
+
+        cache_lookup("embedding", hit=False)
+        with span("embed"):
+            embedding, usage = self.embedder.get_embedding_and_usage(normalize_text(text))
+        if embedding:
+            self._lru_put(key, embedding)
+            self._db_put({key: embedding})
+        return embedding, usage
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache_key(text) for text in texts]
+        found = {key: self._lru_get(key) for key in keys}
+        found = {key: embedding for key, embedding in found.items() if embedding is not None}
+        found.update(self._db_get([key for key in keys if key not in found]))
+
+        missing = OrderedDict()
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, normalize_text(text))
+        if missing:
+            if hasattr(self.embedder, "get_embeddings"):
+                fresh = self.embedder.get_embeddings(list(missing.values()))
+            else:
+                fresh = [self.embedder.get_embedding(text) for text in missing.values()]
+            fresh = {key: embedding for key, embedding in zip(missing, fresh) if embedding}
+            self._db_put(fresh)
+            found.update(fresh)
+
+        for key, embedding in found.items():
+            self._lru_put(key, embedding)
+        return [found.get(key) or [] for key in keys]
+
+    def embed_documents(self, documents) -> None:
+        """
+        Embeds a batch of documents in as few API calls as possible. The
+        vectors also land in the LRU, so PgVector2's one-by-one
+        ``document.embed`` during upsert is served from memory.
+        """
+        embeddings = self.get_embeddings([document.content for document in documents])
+        for document, embedding in zip(documents, embeddings):
+            document.embedding = embedding
+
+    def _lru_get(self, key):
+        with self._lock:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+            return embedding
+
+    def _lru_put(self, key, embedding):
+        with self._lock:
+            self._lru[key] = embedding
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _db_get(self, keys):
+        if not self.persist or not keys:
+            return {}
+        try:
+            rows = EmbeddingCache.objects.filter(key__in=keys).values_list("key", "embedding")
+            return {key: [float(x) for x in embedding] for key, embedding in rows}
+        except Exception:
+            logger.exception("Embedding cache read failed")
+            return {}
+
+    def _db_put(self, embeddings):
+        if not self.persist or not embeddings:
+            return
+        try:
+            # savepoint, callers may already be inside a transaction
+            with transaction.atomic():
+                EmbeddingCache.objects.bulk_create(
+                    [
+                        EmbeddingCache(key=key, model=self.model_name, dimensions=len(embedding), embedding=embedding)
+                        for key, embedding in embeddings.items()
+                    ],
+                    ignore_conflicts=True,
+                )
+        except Exception:
+            logger.exception("Embedding cache write failed")
+
+
+if settings.EMBEDDING_BACKEND == "local":
+    base_embedder = LocalEmbedder(dimensions=settings.EMBEDDING_DIMENSIONS)
+else:
+    base_embedder = BatchOpenAIEmbedder(
+        model="text-embedding-3-large",
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        api_key=open_api_key,
+    )
+
+embedder = CachingEmbedder(
+    embedder=base_embedder,
+    lru_size=settings.EMBEDDING_CACHE_SIZE,
+    persist=settings.EMBEDDING_CACHE_PERSIST,
+)
@@ -0,0 +1,259 @@
+import os
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from sqlalchemy import and_, delete, or_, select
+from phi.document import Document
+from phi.knowledge.pdf import PDFReader
+from .chunking import chunking_for
+from .embedding import normalize_text
+from .pdf_pages import extract_page_batch
+
+
+logger = logging.getLogger(__name__)
+
+
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+
+def page_workers():
+    return settings.INGEST_PDF_WORKERS or os.cpu_count() or 1
+
+
+def page_pool():
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            # spawn, not fork: the parent has embedding and warm-up threads
+            # running, a forked child can inherit a lock one of them held
+            _page_pool = ProcessPoolExecutor(max_workers=page_workers(),
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return _page_pool
+
+
+class SafePDFReader(PDFReader):
+    """
+    PDFReader that extracts pages lazily in batches across a process pool
+    and drops empty pages as it goes. ``iter_read`` streams chunked
+    documents in page order with at most a few batches held in memory.
+    """
+
+    def read(self, pdf: str):
+        safe_docs = list(self.iter_read(pdf))
+        logger.info("Loaded %d non-empty chunks", len(safe_docs))
+        return safe_docs
+
+    def iter_read(self, pdf):
+        if isinstance(pdf, (str, Path)):
+            doc_name = Path(pdf).stem.replace(" ", "_")
+            pages = self.iter_pages_parallel(str(pdf))
+        else:
+            doc_name = getattr(pdf, "name", "pdf").split(".")[0]
+            pages = self.iter_pages_inline(pdf)
+
+        for page_number, text in pages:
+            # filter empty documents
+            if not text.strip():
+                continue
+            document = Document(
+                name=doc_name,
+                id=f"{doc_name}_{page_number}",
+                meta_data={"page": page_number},
+                content=text,
+            )
+            if self.chunk:
+                yield from self.chunk_document(document)
+            else:
+                yield document
+
+    def iter_pages_inline(self, pdf):
+        from pypdf import PdfReader
+        for number, page in enumerate(PdfReader(pdf).pages, start=1):
+            yield number, page.extract_text() or ""
+
+    def iter_pages_parallel(self, path):
+        from pypdf import PdfReader
+        page_count = len(PdfReader(path).pages)
+        batch = settings.INGEST_PDF_PAGE_BATCH
+        if page_count <= batch:
+            yield from extract_page_batch(path, 0, page_count)
+            return
+
+        pool = page_pool()
+        # bounded read-ahead keeps memory flat however long the PDF is
+        max_pending = 2 * page_workers()
+        pending = deque()
+        starts = iter(range(0, page_count, batch))
+
+        for start in starts:
+            pending.append(pool.submit(extract_page_batch, path, start, min(start + batch, page_count)))
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            yield from pending.popleft().result()
+            start = next(starts, None)
+            if start is not None:
+                pending.append(pool.submit(extract_page_batch, path, start, min(start + batch, page_count)))
+
+
+def build_reader(collection=None):
+    """The PDF reader used for a collection, shared by startup loading and uploads."""
+    return SafePDFReader(chunk=True, chunking_strategy=chunking_for(collection or settings.KNOWLEDGE_COLLECTION))
+
+
+def file_fingerprint(file, block_size=1024 * 1024):
+    """sha256 of an uploaded or stored file, leaves the file position at 0."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(block_size), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def chunk_fingerprint(content):
+    return hashlib.sha256(normalize_text(content).encode('utf-8')).hexdigest()
+
+
+def source_key(name):
+    # every chunk row of one logical document (re-uploads included) shares this
+    return hashlib.sha256(name.encode('utf-8')).hexdigest()[:16]
+
+
+def legacy_name(filename):
+    # the document name phi's PDFReader gives a file's chunks
+    return Path(filename).stem.replace(" ", "_")
+
+
+def existing_chunk_ids(vector_db, source, legacy_names=()):
+    """
+    Ids of the rows indexed for ``source``. Rows from before chunks carried
+    a source only have their document name, those count too when it is one
+    of ``legacy_names``.
+    """
+    table = vector_db.table
+    condition = table.c.meta_data['source'].astext == source
+    if legacy_names:
+        condition = or_(condition, and_(
+            ~table.c.meta_data.has_key('source'),
+            table.c.name.in_(sorted(legacy_names)),
+        ))
+    stmt = select(table.c.id).where(condition)
+    with vector_db.Session() as sess:
+        return {row.id for row in sess.execute(stmt)}
+
+
+def delete_chunks(vector_db, ids):
+    if not ids:
+        return
+    table = vector_db.table
+    with vector_db.Session() as sess:
+        with sess.begin():
+            sess.execute(delete(table).where(table.c.id.in_(list(ids))))
+
+
+def fingerprint_documents(documents, source, file_hash):
+    """
+    Gives every chunk a content-addressed id, so an unchanged chunk maps to
+    the row it already has. Works on any iterable and yields as it goes.
+    """
+    prefix = source_key(source)
+    for document in documents:
+        chunk_hash = chunk_fingerprint(document.content)
+        document.id = f"{prefix}_{chunk_hash[:32]}"
+        document.name = source
+        document.meta_data = {
+            **document.meta_data,
+            'source': source,
+            'file_hash': file_hash,
+            'chunk_hash': chunk_hash,
+        }
+        yield document
+
+
+def sync_documents(vector_db, documents, source, file_hash, progress=None, batch_size=None, legacy_names=()):
+    """
+    Brings the rows for ``source`` in line with ``documents``: new chunks are
+    embedded and upserted, chunks that disappeared are deleted and unchanged
+    ones are left alone. Returns counts for each. Legacy rows matched by
+    ``legacy_names`` are replaced like chunks that disappeared.
+
+    ``documents`` may be a generator; it is consumed in one pass and only
+    ``batch_size`` new chunks are held at a time. ``progress`` is called with
+    keyword counters as the work advances.
+    """
+    progress = progress or (lambda **counters: None)
+    # enough chunks per flush to keep every in-flight embedding slot busy
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE * settings.EMBEDDING_MAX_IN_FLIGHT
+    vector_db.create()
+    existing = existing_chunk_ids(vector_db, source, legacy_names)
+
+    seen = set()
+    batch = []
+    total = added = failed = pages = 0
+
+    def flush():
+        nonlocal added, failed
+        try:
+            if hasattr(vector_db.embedder, 'embed_documents'):
+                vector_db.embedder.embed_documents(batch)
+            vector_db.upsert(documents=batch, batch_size=len(batch))
+            added += len(batch)
+        except Exception:
+            logger.exception("Failed to index %d chunks of %s", len(batch), source)
+            failed += len(batch)
+        batch.clear()
+        progress(pages_parsed=pages, chunks_total=total, chunks_embedded=added, failures=failed)
+
+    for document in fingerprint_documents(documents, source, file_hash):
+        # identical chunks inside a file collapse to one row
+        if document.id in seen:
+            continue
+        seen.add(document.id)
+        total += 1
+        pages = max(pages, document.meta_data.get('page') or 0)
+        if document.id in existing:
+            continue
+        batch.append(document)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    progress(pages_parsed=pages, chunks_total=total)
+
+    stale = existing - seen
+    # keep the old rows around if the new version did not fully make it in
+    if not failed:
+        delete_chunks(vector_db, stale)
+        progress(chunks_removed=len(stale))
+
+    stats = {
+        'chunks': total,
+        'added': added,
+        'removed': 0 if failed else len(stale),
+        'unchanged': total - added - failed,
+        'failed': failed,
+    }
+    logger.info("Indexed %s: %s", source, stats)
+    return stats
+
+
+def sync_pdf(record, vector_db, reader, progress=None):
+    # parsing, chunking and embedding overlap: pages stream out of the
+    # reader's process pool while earlier chunks are being embedded
+    documents = reader.iter_read(record.file.path)
+    return sync_documents(vector_db, documents, record.name, record.content_hash, progress=progress,
+                          legacy_names=legacy_names(record))
+
+
+def legacy_names(record):
+    # storage may have renamed an earlier upload's file, so take every stem
+    files = type(record).objects.filter(name=record.name).exclude(file='').values_list('file', flat=True)
+    return {legacy_name(record.name), *(legacy_name(name) for name in files)}
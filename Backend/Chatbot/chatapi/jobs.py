@@ -0,0 +1,87 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import IngestJob, KnowledgeBaseVersion
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_ingest(record):
+    return IngestJob.objects.create(record=record)
+
+
+def claim_next_job():
+    """Marks the oldest queued job as running and returns it, or None."""
+    requeue_stale_jobs()
+    with transaction.atomic():
+        job = (
+            IngestJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=IngestJob.QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = IngestJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'updated_at'])
+    return job
+
+
+def requeue_stale_jobs():
+    # a worker that died mid-job stops touching updated_at, hand its job to someone else
+    cutoff = timezone.now() - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+    IngestJob.objects.filter(status=IngestJob.RUNNING, updated_at__lt=cutoff).update(
+        status=IngestJob.QUEUED, started_at=None,
+    )
+
+
+def run_job(job):
+    # the views import this module for enqueue_ingest, keep the heavy imports out of it
+    from .ingest import build_reader,sync_pdf
+    from .vectordb import build_vector_db
+
+    record = job.record
+
+    def progress(**counters):
+        for field, value in counters.items():
+            setattr(job, field, value)
+        job.save(update_fields=list(counters) + ['updated_at'])
+
+    vector_db = build_vector_db(settings.KNOWLEDGE_COLLECTION)
+    reader = build_reader(settings.KNOWLEDGE_COLLECTION)
+
+    try:
+        stats = sync_pdf(record, vector_db, reader, progress=progress)
+    except Exception as e:
+        logger.exception("Ingest job %s failed", job.pk)
+        job.status = IngestJob.FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        return job
+
+    record.chunk_count = stats['chunks']
+    record.save(update_fields=['chunk_count'])
+    if stats['added'] or stats['removed']:
+        KnowledgeBaseVersion.bump()
+        try:
+            # creates the ANN index on first ingest, rebuilds IVFFlat once it has drifted
+            action = vector_db.maintain_index()
+            if action:
+                logger.info("Vector index %s after job %s", action, job.pk)
+        except Exception:
+            logger.exception("Vector index maintenance failed after job %s", job.pk)
+
+    if stats['failed']:
+        job.status = IngestJob.FAILED
+        job.error = f"{stats['failed']} chunks could not be embedded"
+    else:
+        job.status = IngestJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
@@ -0,0 +1,417 @@
+import json
+import time
+import uuid
+import base64
+import struct
+import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .metrics import percentile
+
+
+logger = logging.getLogger(__name__)
+
+# Run the app against the stand-in with OPENAI_BASE_URL=http://<host>:<port>/v1
+# and any OPENAI_API_KEY; nothing here talks to OpenAI.
+
+ANSWER_WORDS = (
+    "The University of Karachi offers undergraduate and graduate programs across many faculties. "
+    "Admission is merit based and the fee structure depends on the program and the shift. "
+    "Please check the prospectus for deadlines, eligibility criteria and required documents."
+).split()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI API: streamed and plain chat completions and embeddings.
+    Timing comes from the server: ``ttft`` seconds before the first token,
+    then ``tokens_per_second``. Answers and embeddings are derived from the
+    request, so runs are repeatable.
+    """
+
+    protocol_version = "HTTP/1.1"
+    ttft = 0.3
+    tokens_per_second = 50.0
+    answer_tokens = 120
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self.send_json({"error": {"message": "invalid JSON"}}, status=400)
+        if self.path.endswith("/chat/completions"):
+            return self.chat_completion(body)
+        if self.path.endswith("/embeddings"):
+            return self.embeddings(body)
+        self.send_json({"error": {"message": f"unknown path {self.path}"}}, status=404)
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_chunk(self, payload):
+        data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    # chat
+
+    def chat_completion(self, body):
+        messages = body.get("messages") or []
+        prompt = " ".join(str(m.get("content") or "") for m in messages)
+        prompt_tokens = max(1, len(prompt) // 4)
+        tool_call = self.knowledge_tool_call(body, messages)
+        words = self.answer(prompt)
+
+        if not body.get("stream"):
+            # memory classifier ("no") and session summarizer (JSON) calls
+            content = '{"summary": "The user asked about the university.", "topics": ["university"]}' \
+                if (body.get("response_format") or {}).get("type") == "json_object" else "no"
+            time.sleep(self.ttft + len(content.split()) / self.tokens_per_second)
+            return self.send_json(self.completion(body, {"role": "assistant", "content": content}, "stop",
+                                                  prompt_tokens, len(content.split())))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.ttft)
+        if tool_call:
+            self.send_chunk(self.chunk(body, {"role": "assistant", "tool_calls": [tool_call]}))
+            finish, completion_tokens = "tool_calls", 10
+        else:
+            delay = 1 / self.tokens_per_second
+            for number, word in enumerate(words):
+                delta = {"content": word + " "}
+                if number == 0:
+                    delta["role"] = "assistant"
+                self.send_chunk(self.chunk(body, delta))
+                time.sleep(delay)
+            finish, completion_tokens = "stop", len(words)
+        self.send_chunk(self.chunk(body, {}, finish))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.send_chunk({**self.chunk(body, {}), "choices": [], "usage": usage(prompt_tokens, completion_tokens)})
+        self.send_chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def knowledge_tool_call(self, body, messages):
+        # search the knowledge base once per question, like gpt-4o does here
+        tools = [tool.get("function", {}).get("name") for tool in body.get("tools") or []]
+        if "search_knowledge_base" not in tools or not messages or messages[-1].get("role") != "user":
+            return None
+        return {
+            "index": 0,
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": "search_knowledge_base",
+                         "arguments": json.dumps({"query": str(messages[-1].get("content") or "")})},
+        }
+
+    def answer(self, prompt):
+        start = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16) % len(ANSWER_WORDS)
+        return [ANSWER_WORDS[(start + i) % len(ANSWER_WORDS)] for i in range(self.answer_tokens)]
+
+    def completion(self, body, message, finish, prompt_tokens, completion_tokens):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+            "usage": usage(prompt_tokens, completion_tokens),
+        }
+
+    def chunk(self, body, delta, finish=None):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+
+    # embeddings
+
+    def embeddings(self, body):
+        from .embedding import LocalEmbedder
+
+        texts = body.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        embedder = LocalEmbedder(dimensions=body.get("dimensions") or 1536)
+        data = []
+        for index, text in enumerate(texts):
+            embedding = embedder.get_embedding(str(text))
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(struct.pack(f"<{len(embedding)}f", *embedding)).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(max(1, len(str(text)) // 4) for text in texts)
+        self.send_json({"object": "list", "data": data, "model": body.get("model"), "usage": usage(tokens, 0)})
+
+
+def usage(prompt_tokens, completion_tokens):
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def fake_openai_server(host="127.0.0.1", port=8100, ttft=0.3, tokens_per_second=50.0, answer_tokens=120):
+    handler = type("Handler", (FakeOpenAIHandler,), {
+        "ttft": ttft, "tokens_per_second": tokens_per_second, "answer_tokens": answer_tokens,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class FakeGoogleCertsHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for Google's certificate endpoint. ``GET /oauth2/v1/certs``
+    serves the public keys with Cache-Control max-age like Google does,
+    ``POST /token`` signs an ID token for the JSON claims in the body (missing
+    iss, aud, iat and exp are filled in) and ``POST /rotate`` adds a new key
+    and signs with it from then on. Run the app with
+    GOOGLE_CERTS_URL=http://<host>:<port>/oauth2/v1/certs.
+    """
+
+    protocol_version = "HTTP/1.1"
+    keys = None
+    max_age = 3600
+    client_id = "loadtest-client"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if not self.path.startswith("/oauth2/v1/certs"):
+            return self.send_json({"error": f"unknown path {self.path}"}, status=404)
+        certs = {key_id: public_pem for key_id, _, public_pem in self.keys}
+        self.send_json(certs, headers={"Cache-Control": f"public, max-age={self.max_age}, must-revalidate"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self.send_json({"error": "invalid JSON"}, status=400)
+        if self.path == "/rotate":
+            self.keys.append(signing_key())
+            return self.send_json({"kid": self.keys[-1][0]})
+        if self.path == "/token":
+            return self.send_json({"id_token": self.sign(body)})
+        self.send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def sign(self, claims):
+        from google.auth import jwt
+
+        now = int(time.time())
+        email = claims.get("email", "loadtest-google@example.com")
+        claims = {"iss": "https://accounts.google.com", "aud": self.client_id, "iat": now, "exp": now + 3600,
+                  "sub": hashlib.sha1(email.encode()).hexdigest()[:21], "email": email,
+                  "email_verified": True, "name": email.split("@")[0], **claims}
+        return jwt.encode(self.keys[-1][1], claims).decode("ascii")
+
+
+def signing_key():
+    """(key id, signer, public key PEM) for a fresh RSA key."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from google.auth.crypt import RSASigner
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_id = uuid.uuid4().hex
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    public_pem = key.public_key().public_bytes(serialization.Encoding.PEM,
+                                               serialization.PublicFormat.SubjectPublicKeyInfo)
+    return key_id, RSASigner.from_string(private_pem, key_id=key_id), public_pem.decode("ascii")
+
+
+def fake_google_server(host="127.0.0.1", port=8200, max_age=3600, client_id="loadtest-client"):
+    handler = type("Handler", (FakeGoogleCertsHandler,), {
+        "keys": [signing_key()], "max_age": max_age, "client_id": client_id,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def minimal_pdf(pages):
+    """A PDF with one page per list of text lines in ``pages``, readable by pypdf."""
+    def escape(text):
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    # 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    kids = " ".join(f"{4 + 2 * number} 0 R" for number in range(len(pages)))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode("ascii"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for number, lines in enumerate(pages):
+        text = " T* ".join(f"({escape(line)}) Tj" for line in lines)
+        stream = f"BT /F1 11 Tf 14 TL 72 720 Td {text} ET".encode("latin-1", "replace")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % (5 + 2 * number)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+QUESTIONS = [
+    "What are the admission requirements for BS programs?",
+    "How much is the fee for the morning shift?",
+    "When does the fall semester start?",
+    "Which documents are needed for enrollment?",
+    "Is there a hostel for female students?",
+]
+
+
+class LoadDriver:
+    """
+    Fires requests at a running server from ``concurrency`` threads and
+    collects latencies per scenario. ``tokens`` are JWT access tokens; they
+    are used round robin so per-user rate limits can be spread out.
+    ``google_tokens`` are ID tokens from the Google stand-in for google-login.
+    """
+
+    def __init__(self, base_url, tokens, admin_token=None, concurrency=10, stream=False, timeout=120,
+                 google_tokens=None):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.tokens = tokens
+        self.admin_token = admin_token
+        self.concurrency = concurrency
+        self.stream = stream
+        self.google_tokens = google_tokens or []
+        self.client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def next_number(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def headers(self, number, admin=False):
+        token = self.admin_token if admin else self.tokens[number % len(self.tokens)]
+        return {"Authorization": f"Bearer {token}"}
+
+    def chat(self, number):
+        payload = {"prompt": QUESTIONS[number % len(QUESTIONS)], "conversation_id": f"load-{number % 50}"}
+        if not self.stream:
+            response = self.client.post(f"{self.base_url}/bot/chat/", json=payload, headers=self.headers(number))
+            return response.status_code, None
+        payload["stream"] = True
+        start = time.perf_counter()
+        first_byte = None
+        with self.client.stream("POST", f"{self.base_url}/bot/chat/", json=payload, headers=self.headers(number)) as response:
+            for _ in response.iter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+        return response.status_code, first_byte
+
+    def chat_data(self, number):
+        response = self.client.get(f"{self.base_url}/bot/chat-data/",
+                                   params={"conversation_id": f"load-{number % 50}"}, headers=self.headers(number))
+        return response.status_code, None
+
+    def upload(self, number):
+        name = f"loadtest-{uuid.uuid4().hex[:12]}.pdf"
+        pdf = minimal_pdf([[f"Load test document {name}", *QUESTIONS]])
+        response = self.client.post(f"{self.base_url}/bot/upload_file/", files={"file": (name, pdf, "application/pdf")},
+                                    headers=self.headers(number, admin=True))
+        return response.status_code, None
+
+    def google_login(self, number):
+        response = self.client.post(f"{self.base_url}/user/google/login/",
+                                    json={"id_token": self.google_tokens[number % len(self.google_tokens)]})
+        return response.status_code, None
+
+    def run(self, scenario, requests=100, duration=None):
+        """Runs one scenario; stops after ``requests`` requests or ``duration`` seconds."""
+        call = {"chat": self.chat, "chat-data": self.chat_data, "upload": self.upload,
+                "google-login": self.google_login}[scenario]
+        results = []
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = [requests]
+
+        def take():
+            with self._lock:
+                if deadline is not None:
+                    return time.perf_counter() < deadline
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker():
+            while take():
+                number = self.next_number()
+                start = time.perf_counter()
+                try:
+                    status, first_byte = call(number)
+                except Exception as e:
+                    status, first_byte = type(e).__name__, None
+                results.append((status, time.perf_counter() - start, first_byte))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(self.concurrency)]:
+                future.result()
+        return summarize(scenario, results, time.perf_counter() - started)
+
+
+def summarize(scenario, results, elapsed):
+    ok = [latency for status, latency, _ in results if isinstance(status, int) and status < 400]
+    first_bytes = [first_byte for status, _, first_byte in results if first_byte is not None]
+    statuses = Counter(str(status) for status, _, _ in results)
+    summary = {
+        "scenario": scenario,
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": dict(sorted(statuses.items())),
+        "seconds": elapsed,
+        "throughput": len(ok) / elapsed if elapsed else 0.0,
+    }
+    for q in (50, 95, 99):
+        summary[f"p{q}_ms"] = percentile(ok, q) * 1000
+    if first_bytes:
+        for q in (50, 95, 99):
+            summary[f"ttfb_p{q}_ms"] = percentile(first_bytes, q) * 1000
+    return summary
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from chatapi.loadtest import fake_google_server
+
+
+class Command(BaseCommand):
+    help = ("Serve a local stand-in for Google's ID-token signing certificates, which also signs test "
+            "ID tokens (POST /token). Point the app at it with "
+            "GOOGLE_CERTS_URL=http://HOST:PORT/oauth2/v1/certs and GOOGLE_CLIENT_ID=<--client-id>.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8200)
+        parser.add_argument('--max-age', type=int, default=3600, help="Cache-Control max-age of the certificates.")
+        parser.add_argument('--client-id', default='loadtest-client', help="Audience of the signed tokens.")
+
+    def handle(self, *args, **options):
+        server = fake_google_server(options['host'], options['port'],
+                                    max_age=options['max_age'], client_id=options['client_id'])
+        self.stdout.write(f"Fake Google certificates on http://{options['host']}:{options['port']}/oauth2/v1/certs")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
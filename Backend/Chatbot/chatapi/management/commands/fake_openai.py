@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from chatapi.loadtest import fake_openai_server
+
+
+class Command(BaseCommand):
+    help = ("Serve a local OpenAI stand-in (streamed chat completions and deterministic embeddings) "
+            "for load tests. Point the app at it with OPENAI_BASE_URL=http://HOST:PORT/v1.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--ttft', type=float, default=0.3, help="Seconds before the first streamed token.")
+        parser.add_argument('--tokens-per-second', type=float, default=50.0)
+        parser.add_argument('--answer-tokens', type=int, default=120, help="Length of every streamed answer.")
+
+    def handle(self, *args, **options):
+        server = fake_openai_server(
+            options['host'], options['port'],
+            ttft=options['ttft'],
+            tokens_per_second=options['tokens_per_second'],
+            answer_tokens=options['answer_tokens'],
+        )
+        self.stdout.write(f"Fake OpenAI listening on http://{options['host']}:{options['port']}/v1")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
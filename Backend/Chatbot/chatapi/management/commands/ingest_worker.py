@@ -0,0 +1,30 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chatapi.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued PDF ingest jobs from the IngestJob table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit instead of polling.")
+        parser.add_argument('--poll', type=float, default=settings.INGEST_WORKER_POLL_SECONDS,
+                            help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Ingest worker started")
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+
+            self.stdout.write(f"Job {job.pk}: indexing {job.record.name}")
+            job = run_job(job)
+            self.stdout.write(
+                f"Job {job.pk}: {job.status} ({job.chunks_embedded}/{job.chunks_total} chunks embedded, "
+                f"{job.failures} failures)"
+            )
@@ -0,0 +1,81 @@
+import json
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from user.models import User
+from chatapi.loadtest import LoadDriver
+
+SCENARIOS = ['chat', 'chat-data', 'upload', 'google-login']
+
+
+def load_test_user(email, admin=False):
+    user, _ = User.objects.get_or_create(email=email, defaults={'username': email.split('@')[0], 'is_approved': True})
+    if admin and not user.is_admin:
+        user.is_admin = True
+        user.save(update_fields=['is_admin'])
+    return user
+
+
+class Command(BaseCommand):
+    help = ("Drive a running server with concurrent chat, chat-data, upload and google-login requests and report "
+            "p50/p95/p99 latency and throughput. Creates loadtest users in this database and signs "
+            "their tokens with this SECRET_KEY; uploads are real and get ingested, so run it "
+            "against a disposable database and the fake_openai server.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=['chat', 'chat-data'])
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=100, help="Requests per scenario.")
+        parser.add_argument('--duration', type=float, help="Seconds per scenario, instead of --requests.")
+        parser.add_argument('--users', type=int, default=1,
+                            help="Spread requests over this many users (each has its own rate limit bucket).")
+        parser.add_argument('--stream', action='store_true', help="Stream chat answers and report time to first byte.")
+        parser.add_argument('--google-url', default='http://127.0.0.1:8200',
+                            help="fake_google_certs server that signs the ID tokens for google-login.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON lines.")
+
+    def google_tokens(self, url, count):
+        import httpx
+
+        try:
+            return [httpx.post(f"{url.rstrip('/')}/token", json={"email": f"loadtest-google{n}@example.com"}).json()["id_token"]
+                    for n in range(count)]
+        except httpx.HTTPError as e:
+            raise CommandError(f"Could not get ID tokens from {url}: {e}")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['users'] < 1:
+            raise CommandError("--concurrency and --users must be at least 1")
+
+        # httpx logs every request at INFO
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        users = [load_test_user(f"loadtest{n}@example.com") for n in range(options['users'])]
+        tokens = [str(RefreshToken.for_user(user).access_token) for user in users]
+        admin_token = None
+        if 'upload' in options['scenario']:
+            admin_token = str(RefreshToken.for_user(load_test_user("loadtest-admin@example.com", admin=True)).access_token)
+
+        google_tokens = None
+        if 'google-login' in options['scenario']:
+            google_tokens = self.google_tokens(options['google_url'], options['users'])
+
+        driver = LoadDriver(options['url'], tokens, admin_token=admin_token,
+                            concurrency=options['concurrency'], stream=options['stream'],
+                            google_tokens=google_tokens)
+        for scenario in options['scenario']:
+            summary = driver.run(scenario, requests=options['requests'], duration=options['duration'])
+            if options['json']:
+                self.stdout.write(json.dumps(summary))
+                continue
+            self.stdout.write(
+                f"{scenario:<10} {summary['requests']:>6} req  {summary['ok']:>6} ok  "
+                f"{summary['throughput']:8.2f} req/s  p50 {summary['p50_ms']:8.1f}ms  "
+                f"p95 {summary['p95_ms']:8.1f}ms  p99 {summary['p99_ms']:8.1f}ms"
+            )
+            if 'ttfb_p50_ms' in summary:
+                self.stdout.write(
+                    f"{'':<10} first byte  p50 {summary['ttfb_p50_ms']:8.1f}ms  "
+                    f"p95 {summary['ttfb_p95_ms']:8.1f}ms  p99 {summary['ttfb_p99_ms']:8.1f}ms"
+                )
+            self.stdout.write(f"{'':<10} statuses {summary['statuses']}")
@@ -0,0 +1,68 @@
+import json
+import glob
+import os
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from chatapi.benchmark import FIXTURE, configurations, load_fixture, run_configuration, write_fixture_pdfs
+
+
+def size_kb(size):
+    return f"{(size or 0) / 1024:.0f}kB"
+
+
+class Command(BaseCommand):
+    help = ("Sweep chunking, embedding size, ANN index and search mode over a labelled question set and "
+            "report recall@k, MRR, chunk count, index size and search latency. Runs offline: embeddings "
+            "come from the deterministic local embedder and every configuration gets a throwaway table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixture', default=FIXTURE,
+                            help="JSON with 'documents' (rendered to PDFs) and 'questions' "
+                                 "({question, expected passage}).")
+        parser.add_argument('--pdf-dir', help="Benchmark these PDFs (with the fixture's questions) instead of its documents.")
+        parser.add_argument('--chunk-tokens', type=int, nargs='+', default=[100, 300])
+        parser.add_argument('--overlap-tokens', type=int, nargs='+', default=[25])
+        parser.add_argument('--dimensions', type=int, nargs='+', default=[256, 1536])
+        parser.add_argument('--index', nargs='+', choices=['hnsw', 'ivfflat', 'none'], default=['hnsw', 'none'])
+        parser.add_argument('--mode', nargs='+', choices=['vector', 'text', 'hybrid'], default=['vector', 'hybrid'])
+        parser.add_argument('--k', type=int, nargs='+', default=[1, 3, 5])
+        parser.add_argument('--depth', type=int, default=10, help="Results fetched per question for MRR.")
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark tables for inspection.")
+        parser.add_argument('--json', action='store_true', help="Print one JSON line per configuration.")
+        parser.add_argument('--show-misses', action='store_true')
+
+    def handle(self, *args, **options):
+        fixture = load_fixture(options['fixture'])
+        questions = fixture['questions']
+        if not questions:
+            raise CommandError("The fixture has no questions")
+        ks = sorted(options['k'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            if options['pdf_dir']:
+                pdf_paths = sorted(glob.glob(os.path.join(options['pdf_dir'], '*.pdf')))
+            else:
+                pdf_paths = write_fixture_pdfs(fixture['documents'], directory)
+            if not pdf_paths:
+                raise CommandError("No PDFs to index")
+
+            for config in configurations(options['chunk_tokens'], options['overlap_tokens'],
+                                         options['dimensions'], options['index']):
+                for result in run_configuration(config, pdf_paths, questions, options['mode'],
+                                                ks=ks, depth=options['depth'], keep=options['keep']):
+                    self.report(result, ks, options)
+
+    def report(self, result, ks, options):
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+            return
+        recall = "  ".join(f"R@{k} {result[f'recall@{k}']:.2f}" for k in ks)
+        self.stdout.write(
+            f"chunk {result['chunk_tokens']:>4}/{result['overlap_tokens']:<3} dims {result['dimensions']:>5} "
+            f"{result['index']:<8}{result['mode']:<7} {recall}  MRR {result['mrr']:.3f}  "
+            f"chunks {result['chunks']:>5}  table {size_kb(result['table_bytes']):>7}  "
+            f"index {size_kb(result['index_bytes']):>7}  p50 {result['p50_ms']:6.1f}ms  p95 {result['p95_ms']:6.1f}ms"
+        )
+        if options['show_misses']:
+            for question in result['misses']:
+                self.stdout.write(f"    miss: {question}")
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from phi.vectordb.pgvector.index import HNSW
+from chatapi.vectordb import build_vector_db, measure_recall
+
+
+def size_mb(size):
+    return f"{(size or 0) / 1024 / 1024:.1f} MB"
+
+
+class Command(BaseCommand):
+    help = "Report, create or rebuild the ANN index of a vector collection and measure its recall."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default=settings.KNOWLEDGE_COLLECTION)
+        parser.add_argument('--create', action='store_true', help="Create the index if it is missing or stale.")
+        parser.add_argument('--rebuild', action='store_true', help="Rebuild the index concurrently.")
+        parser.add_argument('--reencode', action='store_true',
+                            help="Convert stored embeddings to the configured storage type and dimensions.")
+        parser.add_argument('--recall', type=int, default=0, metavar='N',
+                            help="Measure recall@k against exact search on N sampled chunks.")
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--ef-search', type=int, nargs='*', default=[],
+                            help="HNSW ef_search values to compare (default: configured value).")
+        parser.add_argument('--probes', type=int, nargs='*', default=[],
+                            help="IVFFlat probes values to compare (default: configured value).")
+
+    def handle(self, *args, **options):
+        vector_db = build_vector_db(options['collection'])
+        if not vector_db.table_exists():
+            self.stdout.write(f"Collection {vector_db.collection} has no table yet")
+            return
+
+        if options['reencode']:
+            before = vector_db.stored_type()
+            converted = vector_db.reencode()
+            self.stdout.write(f"Re-encoded {converted} rows from {before} to {vector_db.stored_type()}")
+
+        if options['rebuild']:
+            vector_db.build_index()
+            self.stdout.write("Index rebuilt")
+        elif options['create']:
+            self.stdout.write(f"Index {vector_db.maintain_index() or 'up to date'}")
+
+        rows = vector_db.get_count()
+        self.stdout.write(f"Collection: {vector_db.qualified_name}")
+        self.stdout.write(f"Rows: {rows}  table size: {size_mb(vector_db.table_size())}")
+        self.stdout.write(
+            f"Embeddings: {vector_db.stored_type()} (configured {vector_db.storage}({vector_db.dimensions}), "
+            f"quantization: {vector_db.quantization})"
+        )
+        indexes = vector_db.ann_indexes()
+        if not indexes:
+            self.stdout.write("ANN index: none (searches scan every row)")
+        for info in indexes:
+            built = info['build'].get('rows')
+            self.stdout.write(
+                f"ANN index: {info['name']} ({info['method']}{'' if info['valid'] else ', INVALID'}) "
+                f"size: {size_mb(info['size'])} built at: {built if built is not None else '?'} rows"
+            )
+            self.stdout.write(f"  {info['definition']}")
+
+        if not options['recall'] or not indexes:
+            return
+        if isinstance(vector_db.index, HNSW):
+            runs = [{'ef_search': value} for value in options['ef_search']] or [{'ef_search': None}]
+        else:
+            runs = [{'probes': value} for value in options['probes']] or [{'probes': None}]
+
+        for run in runs:
+            report = measure_recall(vector_db, samples=options['recall'], k=options['k'], **run)
+            knob, value = next(iter(run.items()))
+            if value is None:
+                value = getattr(vector_db.index, knob, None)
+            self.stdout.write(
+                f"{knob}={value}: recall@{report['k']} {report['recall']:.3f} over {report['queries']} queries, "
+                f"ann p50 {report['ann_p50_ms']:.1f} ms p95 {report['ann_p95_ms']:.1f} ms, "
+                f"exact p50 {report['exact_p50_ms']:.1f} ms p95 {report['exact_p95_ms']:.1f} ms"
+            )
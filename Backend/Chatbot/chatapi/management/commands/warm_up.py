@@ -0,0 +1,14 @@
+import time
+from django.core.management.base import BaseCommand
+from chatapi.utils import warm_up
+
+
+class Command(BaseCommand):
+    help = "Build the chat agent components and fill the connection pools, reporting how long each step takes."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        timings = warm_up()
+        for name, seconds in timings.items():
+            self.stdout.write(f"{name:<18}{seconds:8.3f}s")
+        self.stdout.write(f"{'total':<18}{time.perf_counter() - start:8.3f}s")
@@ -0,0 +1,92 @@
+import time
+import logging
+import threading
+from collections import defaultdict
+from .metrics import span
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryUpdater:
+    """
+    Runs the agent's memory bookkeeping on a background thread instead of at
+    the end of every chat turn.
+
+    Turns are only recorded on the request path. The worker waits ``delay``
+    seconds so turns arriving close together are handled as one batch: all
+    new questions from a user go through ``remember(user_id, questions)`` in
+    a single call, and ``summarize(user_id, conversation_id)`` runs once a
+    conversation has ``summary_every`` turns since its last summary.
+    """
+
+    def __init__(self, remember, summarize, summary_every=4, delay=2.0):
+        self.remember = remember
+        self.summarize = summarize
+        self.summary_every = summary_every
+        self.delay = delay
+        self._questions = defaultdict(list)
+        self._turns = defaultdict(int)
+        self._due = set()
+        self._busy = False
+        self._flushing = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def record_turn(self, user_id, conversation_id, question):
+        key = (str(user_id), str(conversation_id))
+        with self._cond:
+            self._questions[key[0]].append(question)
+            self._turns[key] += 1
+            if self._turns[key] >= self.summary_every:
+                self._turns[key] = 0
+                self._due.add(key)
+            self._start()
+            self._cond.notify()
+
+    def flush(self, timeout=None):
+        """Blocks until everything recorded so far has been processed."""
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not (self._questions or self._due or self._busy), timeout)
+            finally:
+                self._flushing = False
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="chat-memory-updates", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._questions or self._due)
+                # let a burst of turns land before taking the batch
+                deadline = time.monotonic() + self.delay
+                while not self._flushing and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                questions, self._questions = self._questions, defaultdict(list)
+                due, self._due = self._due, set()
+                self._busy = True
+            try:
+                self._process(questions, due)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _process(self, questions, due):
+        for user_id, batch in questions.items():
+            try:
+                with span("memory_update"):
+                    self.remember(user_id, batch)
+            except Exception:
+                logger.exception("Memory update failed for user %s", user_id)
+        for user_id, conversation_id in due:
+            try:
+                with span("session_summary"):
+                    self.summarize(user_id, conversation_id)
+            except Exception:
+                logger.exception("Summary refresh failed for %s:%s", user_id, conversation_id)
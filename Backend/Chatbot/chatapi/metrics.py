@@ -0,0 +1,191 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+logger = logging.getLogger(__name__)
+
+# Counters and histograms live in the process that records them, so every
+# web worker exposes its own series on /metrics (scrape each worker, or run
+# one per container) - the same model as prometheus_client without its
+# multiprocess mode, and no extra dependency.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.append(self)
+
+    def key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def format_labels(self, key, **extra):
+        pairs = list(zip(self.labels, key)) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self.samples(items))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, items):
+        for key, value in items:
+            yield f"{self.name}{self.format_labels(key)} {value}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self, items):
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f"{self.name}_bucket{self.format_labels(key, le=le)} {cumulative}"
+            yield f"{self.name}_sum{self.format_labels(key)} {total}"
+            yield f"{self.name}_count{self.format_labels(key)} {cumulative}"
+
+
+registry = []
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+STAGE_SECONDS = Histogram("chat_stage_seconds", "Time spent in each stage of a request.", ["stage"])
+REQUEST_SECONDS = Histogram("chat_request_seconds", "End to end time of traced requests.", ["kind"])
+TOKENS = Counter("chat_tokens_total", "Prompt and completion tokens of the chat model, and retrieved context tokens.", ["kind"])
+CACHE_LOOKUPS = Counter("chat_cache_lookups_total", "Answer and embedding cache lookups.", ["cache", "result"])
+
+
+class Trace:
+    """Per-request stage timings, logged as one line when the request ends."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.details = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def finish(self):
+        total = time.perf_counter() - self.started
+        REQUEST_SECONDS.observe(total, kind=self.kind)
+        breakdown = ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in self.stages.items())
+        details = "".join(f", {name}={value}" for name, value in self.details.items())
+        logger.info("%s request took %.0fms: %s%s", self.kind, total * 1000, breakdown or "no stages", details)
+        return total
+
+
+current_trace = ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def trace(kind):
+    """Collects the spans recorded inside it, in this thread or task, into one Trace."""
+    request_trace = Trace(kind)
+    token = current_trace.set(request_trace)
+    try:
+        yield request_trace
+    finally:
+        request_trace.finish()
+        try:
+            current_trace.reset(token)
+        except ValueError:
+            # a streamed generator can be finished from another context
+            current_trace.set(None)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    request_trace = current_trace.get()
+    if request_trace is not None:
+        request_trace.add(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def count_tokens_used(kind, amount):
+    if amount:
+        TOKENS.inc(amount, kind=kind)
+        request_trace = current_trace.get()
+        if request_trace is not None:
+            request_trace.details[f"{kind}_tokens"] = request_trace.details.get(f"{kind}_tokens", 0) + amount
+
+
+def cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class StreamTimer:
+    """Splits a streamed model call into time to first token and generation."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+
+    def tick(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            observe_stage("time_to_first_token", self.first_token - self.started)
+
+    def finish(self):
+        observe_stage("generate", time.perf_counter() - (self.first_token or self.started))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:17
+
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations, models
+from pgvector.django import VectorExtension
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatapi', '0003_delete_knowledgebase'),
+    ]
+
+    operations = [
+        VectorExtension(),
+        migrations.CreateModel(
+            name='KnowledgeBaseVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CachedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('answer', models.TextField()),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=1536)),
+                ('kb_version', models.PositiveIntegerField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='cachedanswer_embedding_hnsw', opclasses=['vector_cosine_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:19
+
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatapi', '0004_answer_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCache',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=100)),
+                ('dimensions', models.PositiveIntegerField()),
+                ('embedding', pgvector.django.vector.VectorField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
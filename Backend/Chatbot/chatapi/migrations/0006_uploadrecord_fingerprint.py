@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatapi', '0005_embedding_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadrecord',
+            name='chunk_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadrecord',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
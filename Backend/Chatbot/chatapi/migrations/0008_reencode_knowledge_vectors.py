@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Used to re-encode the phi-managed knowledge base table. That is now a
+    # deliberate step (python manage.py vector_index --reencode); the
+    # migration stays, empty, because databases have already recorded it.
+
+    dependencies = [
+        ('chatapi', '0007_ingestjob'),
+    ]
+
+    operations = []
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Used to add the text-search column to the phi-managed knowledge base
+    # table, which ensure_text_search() now does when the table is created
+    # or first searched. Kept empty because databases have recorded it.
+
+    dependencies = [
+        ('chatapi', '0008_reencode_knowledge_vectors'),
+    ]
+
+    operations = []
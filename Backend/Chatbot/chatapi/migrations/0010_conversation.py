@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_default_conversations(apps, schema_editor):
+    # messages saved before conversations existed all belong to "default"
+    ChatMessage = apps.get_model('chatapi', 'ChatMessage')
+    Conversation = apps.get_model('chatapi', 'Conversation')
+    user_ids = ChatMessage.objects.filter(conversation__isnull=True).values_list('user_id', flat=True).distinct()
+    for user_id in user_ids:
+        messages = ChatMessage.objects.filter(user_id=user_id, conversation__isnull=True)
+        first = messages.filter(role='user').order_by('timestemp').first()
+        conversation, _ = Conversation.objects.get_or_create(
+            user_id=user_id, key='default', defaults={'title': first.content[:255] if first else ''},
+        )
+        messages.update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatapi', '0009_knowledge_text_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('title', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chatapi.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['user', 'conversation', 'timestemp'], name='chatapi_cha_user_id_b39a92_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user', '-updated_at'], name='chatapi_con_user_id_d1be33_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='unique_conversation_key_per_user'),
+        ),
+        migrations.RunPython(assign_default_conversations, migrations.RunPython.noop),
+    ]
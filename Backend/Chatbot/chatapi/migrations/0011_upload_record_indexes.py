@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatapi', '0010_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='uploadrecord',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='chatapi_upl_uploade_1f34da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadrecord',
+            index=models.Index(fields=['uploaded_by', '-uploaded_at'], name='chatapi_upl_uploade_d4df35_idx'),
+        ),
+    ]
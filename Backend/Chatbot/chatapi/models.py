@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F
+from pgvector.django import HnswIndex, VectorField
 from user.models import User
 # Create your models here.
 
@@ -9,17 +11,151 @@ class UploadRecord(models.Model):
     name = models.CharField(max_length=255,null=True,blank=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # sha256 of the file bytes, identical re-uploads are skipped
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    chunk_count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        # the admin upload list, newest first, optionally per uploader
+        indexes = [
+            models.Index(fields=['-uploaded_at', '-id']),
+            models.Index(fields=['uploaded_by', '-uploaded_at']),
+        ]
 
     def __str__(self):
 
         return f'{self.name} - {self.uploaded_by} - {self.uploaded_at}'
-    
+
+
+class IngestJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED,'Queued'),(RUNNING,'Running'),(DONE,'Done'),(FAILED,'Failed')]
+
+    record = models.ForeignKey(UploadRecord, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    pages_parsed = models.PositiveIntegerField(default=0)
+    chunks_total = models.PositiveIntegerField(default=0)
+    chunks_embedded = models.PositiveIntegerField(default=0)
+    chunks_removed = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # doubles as the worker heartbeat, progress saves bump it
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f'{self.record.name} - {self.status}'
+
+class Conversation(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    # the conversation_id clients send with each chat request
+    key = models.CharField(max_length=100)
+    title = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'key'], name='unique_conversation_key_per_user')]
+        indexes = [models.Index(fields=['user', '-updated_at'])]
+
+    def __str__(self):
+        return f'{self.user} - {self.key}'
+
+
 class ChatMessage(models.Model):
     ROLE_CHOICES = [('user','User'),('assistant','Assistant')]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_messages')
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name='messages', null=True, blank=True,
+    )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     content = models.TextField()
     timestemp = models.DateTimeField(auto_now_add=True)
-    
\ No newline at end of file
+
+    class Meta:
+        # history pages are read per user and conversation in time order
+        indexes = [models.Index(fields=['user', 'conversation', 'timestemp'])]
+
+
+class KnowledgeBaseVersion(models.Model):
+    # single row, bumped after every successful ingest
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls):
+        row, _ = cls.objects.get_or_create(pk=1)
+        return row.version
+
+    @classmethod
+    def bump(cls):
+        cls.objects.get_or_create(pk=1)
+        cls.objects.filter(pk=1).update(version=F('version') + 1)
+        version = cls.current()
+        # answers built on older knowledge are never served again
+        CachedAnswer.objects.filter(kb_version__lt=version).delete()
+        return version
+
+    def __str__(self):
+        return f'v{self.version}'
+
+
+# Fixed, so the schema doesn't follow EMBEDDING_DIMENSIONS; question
+# embeddings are fitted to it (see answer_cache). Changing it needs a migration.
+ANSWER_CACHE_DIMENSIONS = 1536
+
+
+class CachedAnswer(models.Model):
+    question = models.TextField()
+    answer = models.TextField()
+    embedding = VectorField(dimensions=ANSWER_CACHE_DIMENSIONS)
+    kb_version = models.PositiveIntegerField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            HnswIndex(
+                name='cachedanswer_embedding_hnsw',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.question[:50]} (v{self.kb_version}, {self.hits} hits)'
+
+
+class EmbeddingCache(models.Model):
+    # sha256 of model, dimensions and normalized text, see CachingEmbedder
+    key = models.CharField(max_length=64, primary_key=True)
+    model = models.CharField(max_length=100)
+    dimensions = models.PositiveIntegerField()
+    embedding = VectorField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.model}/{self.dimensions} {self.key[:12]}'
+
+
+class RateLimitBucket(models.Model):
+    # shared token bucket state, so every web process draws from the same budget
+    key = models.CharField(max_length=100, primary_key=True)
+    # below zero once requests are queued: each queued request owes one token
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.key} - {self.tokens:.2f}'
@@ -0,0 +1,39 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class CursorPage(CursorPagination):
+    """
+    Keyset pagination: the cursor encodes the last row's ordering value, so
+    every page is an index range scan however deep the history goes.
+    Responses keep the endpoint's existing {results_key: [...]} shape plus
+    next/previous links.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    results_key = 'data'
+
+    def get_paginated_response(self, data):
+        return Response({self.results_key: data, 'next': self.get_next_link(), 'previous': self.get_previous_link()})
+
+
+class ChatHistoryPagination(CursorPage):
+    # newest page first, "next" walks back in time
+    ordering = ('-timestemp', '-id')
+
+    def get_paginated_response(self, data):
+        # each page reads top to bottom like the chat itself
+        response = super().get_paginated_response(data)
+        response.data[self.results_key] = list(reversed(response.data[self.results_key]))
+        return response
+
+
+class ConversationPagination(CursorPage):
+    ordering = ('-updated_at', '-id')
+
+
+class UploadPagination(CursorPage):
+    ordering = ('-uploaded_at', '-id')
+    # the admin panel reads the list from 'message'
+    results_key = 'message'
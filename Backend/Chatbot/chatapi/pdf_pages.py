@@ -0,0 +1,9 @@
+# Runs inside the ingest page pool's worker processes. Keep it free of Django
+# and of the rest of chatapi, so a fresh worker only has to import pypdf.
+
+
+def extract_page_batch(path, start, stop):
+    # opens its own handle so nothing big is pickled
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [(number + 1, reader.pages[number].extract_text() or "") for number in range(start, stop)]
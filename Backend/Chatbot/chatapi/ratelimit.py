@@ -0,0 +1,136 @@
+import math
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+from .db import database_sync_to_async
+from .metrics import observe_stage
+from .models import RateLimitBucket
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Bucket:
+    key: str
+    per_minute: float
+    burst: int
+    queue: int
+
+    @property
+    def rate(self):
+        return self.per_minute / 60
+
+
+def chat_buckets(user_id):
+    # the site bucket sorts first, so every request locks rows in the same order
+    return [
+        Bucket("chat:global", settings.CHAT_GLOBAL_REQUESTS_PER_MINUTE, settings.CHAT_GLOBAL_BURST, settings.CHAT_GLOBAL_QUEUE),
+        Bucket(f"chat:user:{user_id}", settings.CHAT_USER_REQUESTS_PER_MINUTE, settings.CHAT_USER_BURST, settings.CHAT_USER_QUEUE),
+    ]
+
+
+def reserve(buckets):
+    """
+    Takes one token from every bucket, or from none of them.
+
+    A bucket with no token left goes into debt instead, up to ``queue``
+    tokens: the request is admitted and has to wait until the debt it joined
+    is paid back by the refill, which makes the wait first come, first
+    served. Returns ``(True, seconds to wait)``, or ``(False, retry after)``
+    when a queue is full.
+    """
+    buckets = sorted((b for b in buckets if b.per_minute > 0), key=lambda b: b.key)
+    if not buckets:
+        return True, 0.0
+    with transaction.atomic():
+        RateLimitBucket.objects.bulk_create(
+            [RateLimitBucket(key=b.key, tokens=b.burst, updated_at=timezone.now()) for b in buckets],
+            ignore_conflicts=True,
+        )
+        rows = {row.key: row for row in RateLimitBucket.objects.select_for_update().filter(
+            key__in=[b.key for b in buckets]).order_by('key')}
+        # read the clock once the rows are ours: a request that queued on the
+        # lock would otherwise refill from before the previous holder's update
+        now = timezone.now()
+
+        wait = retry_after = 0.0
+        for bucket in buckets:
+            row = rows[bucket.key]
+            elapsed = max(0.0, (now - row.updated_at).total_seconds())
+            row.tokens = min(bucket.burst, row.tokens + elapsed * bucket.rate) - 1
+            # another server's clock may be behind, never move it backwards
+            row.updated_at = max(row.updated_at, now)
+            if row.tokens < -bucket.queue:
+                retry_after = max(retry_after, (-bucket.queue - row.tokens) / bucket.rate)
+            elif row.tokens < 0:
+                wait = max(wait, -row.tokens / bucket.rate)
+        if retry_after:
+            return False, retry_after
+        RateLimitBucket.objects.bulk_update(rows.values(), ['tokens', 'updated_at'])
+    return True, wait
+
+
+def admit(user_id):
+    if not settings.CHAT_RATE_LIMIT_ENABLED:
+        return True, 0.0
+    try:
+        return reserve(chat_buckets(user_id))
+    except Exception:
+        # a limiter outage should not take the chat down with it
+        logger.exception("Rate limiter failed, admitting request")
+        return True, 0.0
+
+
+class ChatThrottle(BaseThrottle):
+    """
+    DRF throttle for the chat endpoint: waits in the admission queue when
+    the caller's buckets are empty, DRF turns a refusal into a 429 with
+    Retry-After.
+
+    A view whose ``streams_async(request)`` is true waits itself, on the
+    event loop (see ``after_admission``): sleeping here would hold up the
+    thread an ASGI server runs every sync view on. The wait is left in
+    ``request.admission_wait``.
+    """
+
+    def allow_request(self, request, view):
+        admitted, seconds = admit(request.user.pk)
+        if not admitted:
+            self.retry_after = seconds
+            return False
+        if seconds:
+            observe_stage("admission_wait", seconds)
+            streams_async = getattr(view, "streams_async", None)
+            if streams_async is not None and streams_async(request):
+                request.admission_wait = seconds
+            else:
+                time.sleep(seconds)
+        return True
+
+    def wait(self):
+        return math.ceil(self.retry_after)
+
+
+async def aadmit(user_id):
+    """Async admission for the ASGI view; returns None or the Retry-After seconds."""
+    admitted, seconds = await database_sync_to_async(admit)(user_id)
+    if not admitted:
+        return math.ceil(seconds)
+    if seconds:
+        observe_stage("admission_wait", seconds)
+        await asyncio.sleep(seconds)
+    return None
+
+
+async def after_admission(seconds, events):
+    """Passes ``events`` on once the admission wait ChatThrottle left is over."""
+    if seconds:
+        await asyncio.sleep(seconds)
+    async for event in events:
+        yield event
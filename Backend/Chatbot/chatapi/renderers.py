@@ -0,0 +1,19 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    # lets clients send "Accept: text/event-stream" to the chat view; plain
+    # Responses (validation errors etc.) come back as a single error event
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return sse_event('error', data).encode(self.charset)
@@ -0,0 +1,105 @@
+import math
+import logging
+from .chunking import count_tokens
+from .metrics import count_tokens_used, span
+
+
+logger = logging.getLogger(__name__)
+
+# metadata the model can use to cite an answer, the rest (hashes, counters) is prompt noise
+REFERENCE_META_KEYS = ("page", "section")
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def mmr(documents, k, lambda_mult=0.5, duplicate_threshold=0.95):
+    """
+    Maximal marginal relevance over ranked documents. Relevance comes from
+    the retriever's order (hybrid ranks are not cosine scores), redundancy
+    from the stored chunk embeddings. Chunks at least ``duplicate_threshold``
+    similar to one already picked are dropped outright.
+    """
+    count = len(documents)
+    if count <= 1:
+        return list(documents[:k])
+    relevance = [1.0 - rank / count for rank in range(count)]
+
+    selected, remaining = [], list(range(count))
+    while remaining and len(selected) < k:
+        best, best_score = None, None
+        for i in list(remaining):
+            redundancy = max(
+                (cosine(documents[i].embedding, documents[j].embedding) for j in selected
+                 if documents[i].embedding and documents[j].embedding),
+                default=0.0,
+            )
+            if redundancy >= duplicate_threshold:
+                remaining.remove(i)
+                continue
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        selected.append(best)
+        remaining.remove(best)
+    return [documents[i] for i in selected]
+
+
+def pack(documents, max_tokens):
+    """
+    Keeps documents in order while they fit in ``max_tokens``; one that does
+    not fit is skipped so a smaller one further down can still go in. The
+    first document is always kept.
+    """
+    packed, used = [], 0
+    for document in documents:
+        tokens = count_tokens(document.content)
+        if packed and used + tokens > max_tokens:
+            continue
+        packed.append(document)
+        used += tokens
+    return packed
+
+
+def to_reference(document):
+    meta_data = {key: document.meta_data[key] for key in REFERENCE_META_KEYS if key in (document.meta_data or {})}
+    reference = {"name": document.name, "content": document.content}
+    if meta_data:
+        reference["meta_data"] = meta_data
+    return reference
+
+
+class KnowledgeRetriever:
+    """
+    Agent ``retriever`` hook: over-fetches candidates from the knowledge
+    base, removes near-duplicate and overlapping chunks with MMR and packs
+    what is left into a fixed token budget for the prompt.
+    """
+
+    def __init__(self, knowledge, num_documents=4, candidates=12, lambda_mult=0.5, max_tokens=1500):
+        self.knowledge = knowledge
+        self.num_documents = num_documents
+        self.candidates = candidates
+        self.lambda_mult = lambda_mult
+        self.max_tokens = max_tokens
+
+    def __call__(self, agent=None, query="", num_documents=None, **kwargs):
+        limit = num_documents or self.num_documents
+        with span("search"):
+            candidates = self.knowledge.search(query=query, num_documents=max(limit, self.candidates), **kwargs)
+        if not candidates:
+            return None
+        with span("rerank"):
+            documents = pack(mmr(candidates, limit, self.lambda_mult), self.max_tokens)
+        tokens = sum(count_tokens(d.content) for d in documents)
+        count_tokens_used("context", tokens)
+        logger.debug(
+            "Retrieved %d of %d candidate chunks (%d tokens) for %r",
+            len(documents), len(candidates), tokens, query,
+        )
+        return [to_reference(document) for document in documents]
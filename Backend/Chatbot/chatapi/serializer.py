@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import ChatMessage,UploadRecord
+from .models import ChatMessage,Conversation,UploadRecord,IngestJob
 
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,6 +7,13 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         fields = ['id','role','content','timestemp']
 
 
+class ConversationSerializer(serializers.ModelSerializer):
+    conversation_id = serializers.CharField(source='key', read_only=True)
+    class Meta:
+        model = Conversation
+        fields = ['conversation_id','title','created_at','updated_at']
+
+
 class UploadSerializer(serializers.ModelSerializer):
     admin_name = serializers.SerializerMethodField()
     class Meta:
@@ -18,3 +25,10 @@ class UploadSerializer(serializers.ModelSerializer):
 
         return user.username if user else None
 
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    file = serializers.CharField(source='record.name', read_only=True)
+    class Meta:
+        model = IngestJob
+        fields = ['id','file','status','pages_parsed','chunks_total','chunks_embedded',
+                  'chunks_removed','failures','error','created_at','started_at','finished_at']
@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+import threading
+from django.db import connections
+
+
+_DONE = object()
+
+
+class ThreadedStream:
+    """
+    Runs a blocking iterator on its own thread and hands its items to the
+    event loop through an asyncio.Queue. The async chat path uses it for
+    agent runs: phi reads and writes its storage, searches the knowledge
+    base and embeds queries synchronously, and none of that may hold up the
+    loop.
+
+    ``close()`` makes the thread stop at the next item and close the
+    iterator. ``on_finish`` runs on the thread once the iterator is done,
+    failed or was closed.
+    """
+
+    def __init__(self, iterator, on_finish=None, name="chat-run"):
+        self.iterator = iterator
+        self.on_finish = on_finish
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.stopped = threading.Event()
+        self.finished = False
+        # spans recorded on the thread land in the request's trace
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(target=context.run, args=(self._produce,), name=name, daemon=True)
+        self.thread.start()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.finished:
+            raise StopAsyncIteration
+        item, error = await self.queue.get()
+        if item is _DONE:
+            self.finished = True
+            if error is not None:
+                raise error
+            raise StopAsyncIteration
+        return item
+
+    def close(self):
+        self.stopped.set()
+
+    def _send(self, item, error=None):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, (item, error))
+        except RuntimeError:
+            # the loop is closed, nobody is listening any more
+            pass
+
+    def _produce(self):
+        error = None
+        try:
+            for item in self.iterator:
+                if self.stopped.is_set():
+                    break
+                self._send(item)
+        except Exception as e:
+            error = e
+        finally:
+            try:
+                if hasattr(self.iterator, "close"):
+                    self.iterator.close()
+                # Django connections are per thread, hand them back before it ends
+                connections.close_all()
+            finally:
+                if self.on_finish is not None:
+                    self.on_finish()
+                self._send(_DONE, error)
@@ -1,3 +1,1026 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from phi.document import Document
+from phi.vectordb.pgvector.index import HNSW, Ivfflat
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from .agent_pool import AgentPool
+from .answer_cache import SemanticAnswerCache
+from .chunking import TokenChunking, is_numeric_row, is_table_row
+from .db import dispose_engines, get_engine
+from .embedding import CachingEmbedder, LocalEmbedder, TokenBudget
+from .ingest import SafePDFReader, legacy_names, sync_documents
+from .memory_updates import MemoryUpdater
+from .jobs import claim_next_job, enqueue_ingest, run_job
+from .metrics import Histogram, registry
+from .models import CachedAnswer, EmbeddingCache, IngestJob, KnowledgeBaseVersion, RateLimitBucket, UploadRecord
+from .ratelimit import Bucket, ChatThrottle, after_admission, reserve
+from . import utils
+from .utils import aask_phi, llm_semaphore, lookup_cached_answer, remember_answer
+from .retrieval import mmr, pack
+from .vectordb import build_vector_db, reciprocal_rank_fusion
 
-# Create your tests here.
+
+class FallbackTokenizerMixin:
+    # count_tokens without tiktoken is len // 4, the same on every machine
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("chatapi.chunking._encoding", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+
+def test_database_url():
+    url = make_url(settings.SQLALCHEMY_DATABASE_URL).set(database=connection.settings_dict["NAME"])
+    return url.render_as_string(hide_password=False)
+
+
+
+def scratch_vector_db(test, collection=None, dimensions=8, **overrides):
+    """A knowledge table of its own in the test database, dropped after the test."""
+    options = dict(
+        db_engine=get_engine(test_database_url()),
+        embedder=LocalEmbedder(dimensions=dimensions),
+        index=None,
+    )
+    options.update(overrides)
+    vector_db = build_vector_db(collection or f"test_{uuid.uuid4().hex[:12]}", **options)
+    # the test database can only be dropped once the engine let go of it
+    test.addCleanup(vector_db.db_engine.dispose)
+    test.addCleanup(vector_db.drop)
+    return vector_db
+
+
+
+class NumericRowTests(SimpleTestCase):
+    def test_rows_of_numbers(self):
+        self.assertTrue(is_numeric_row("2023   1,200.50   15%"))
+        self.assertTrue(is_numeric_row("01/08/2024 - 15/08/2024 | 3"))
+        self.assertTrue(is_table_row("(1)  2,500  3,000"))
+
+    def test_rows_with_words_or_too_few_numbers(self):
+        self.assertFalse(is_numeric_row("Fees 1,200 1,500 1,800"))
+        self.assertFalse(is_numeric_row("12 - 14"))
+        self.assertFalse(is_numeric_row("snake_case 1 2 3"))
+
+    def test_long_lines_stay_fast(self):
+        # the old regex backtracked for seconds on a line like this one
+        line = " ".join(["01/02/2024"] * 40) + " x"
+        started = time.perf_counter()
+        self.assertFalse(is_table_row(line))
+        self.assertLess(time.perf_counter() - started, 0.1)
+
+
+
+class TokenChunkingTests(FallbackTokenizerMixin, SimpleTestCase):
+    def chunk(self, text, **kwargs):
+        return TokenChunking(**kwargs).chunk(Document(id="fees", name="fees", meta_data={"page": 3}, content=text))
+
+    def test_headings_start_sections(self):
+        text = "FEE STRUCTURE\n" + "Tuition is paid per semester. " * 3 + "\n2.1 Refund Policy\nRefunds are made within thirty days."
+        chunks = self.chunk(text, max_tokens=200)
+        self.assertEqual([c.meta_data["section"] for c in chunks], ["FEE STRUCTURE", "2.1 Refund Policy"])
+        self.assertTrue(chunks[1].content.startswith("2.1 Refund Policy\n"))
+        self.assertEqual([c.id for c in chunks], ["fees_1", "fees_2"])
+        self.assertEqual(chunks[0].meta_data["page"], 3)
+
+    def test_long_tables_split_between_rows_with_the_header(self):
+        header = "Programme    Fee    Seats"
+        rows = [f"Programme {n}    {1000 + n}    {n}" for n in range(30)]
+        chunks = self.chunk("\n".join([header] + rows), max_tokens=60, min_tokens=0)
+        self.assertGreater(len(chunks), 1)
+        seen = []
+        for chunk in chunks:
+            lines = chunk.content.splitlines()
+            self.assertEqual(lines[0], header)
+            self.assertLessEqual(chunk.meta_data["chunk_tokens"], 60)
+            seen.extend(lines[1:])
+        self.assertEqual(seen, rows)
+
+    def test_prose_chunks_overlap(self):
+        lines = [f"Sentence number {n} about admissions." for n in range(12)]
+        chunks = self.chunk("\n".join(lines), max_tokens=40, overlap_tokens=10, min_tokens=5)
+        self.assertGreater(len(chunks), 1)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(chunk.content.splitlines()[0], previous.content.splitlines()[-1])
+        self.assertEqual(chunks[-1].content.splitlines()[-1], lines[-1])
+
+
+
+class ReserveTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        patcher = mock.patch("chatapi.ratelimit.timezone.now", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_queue_then_reject(self):
+        # one token a second, two at once, one more request may queue
+        bucket = Bucket("chat:user:1", per_minute=60, burst=2, queue=1)
+        self.assertEqual(reserve([bucket]), (True, 0.0))
+        self.assertEqual(reserve([bucket]), (True, 0.0))
+        self.assertEqual(reserve([bucket]), (True, 1.0))
+        admitted, retry_after = reserve([bucket])
+        self.assertFalse(admitted)
+        self.assertAlmostEqual(retry_after, 1.0)
+
+        self.now += timedelta(seconds=2)
+        # one refilled token pays the debt back, the other is left
+        self.assertEqual(reserve([bucket]), (True, 0.0))
+        self.assertEqual(reserve([bucket]), (True, 1.0))
+
+    def test_all_or_nothing_across_buckets(self):
+        site = Bucket("chat:global", per_minute=60, burst=5, queue=0)
+        user = Bucket("chat:user:1", per_minute=60, burst=1, queue=0)
+        self.assertEqual(reserve([site, user]), (True, 0.0))
+        self.assertFalse(reserve([site, user])[0])
+        # the rejected request took nothing from the site bucket
+        for _ in range(4):
+            self.assertEqual(reserve([site]), (True, 0.0))
+        self.assertFalse(reserve([site])[0])
+
+    def test_disabled_buckets_are_ignored(self):
+        self.assertEqual(reserve([Bucket("chat:global", per_minute=0, burst=0, queue=0)]), (True, 0.0))
+
+    def test_the_clock_is_read_under_the_lock_and_never_goes_back(self):
+        bucket = Bucket("chat:user:1", per_minute=60, burst=2, queue=0)
+        reserve([bucket])
+        calls = []
+        lock = RateLimitBucket.objects.select_for_update
+
+        def clock():
+            calls.append("now")
+            return self.now - timedelta(seconds=5)
+
+        def select_for_update():
+            calls.append("lock")
+            return lock()
+
+        with mock.patch("chatapi.ratelimit.timezone.now", clock), \
+                mock.patch.object(RateLimitBucket.objects, "select_for_update", select_for_update):
+            reserve([bucket])
+        self.assertEqual(calls[-2:], ["lock", "now"])
+        row = RateLimitBucket.objects.get(key=bucket.key)
+        # a clock 5s behind neither refills nor rewinds the bucket
+        self.assertEqual(row.tokens, 0)
+        self.assertEqual(row.updated_at, self.now)
+
+
+
+class ChatThrottleTests(SimpleTestCase):
+    def allow(self, streams_async):
+        request = SimpleNamespace(user=SimpleNamespace(pk=1))
+        view = SimpleNamespace(streams_async=lambda request: streams_async)
+        with mock.patch("chatapi.ratelimit.admit", return_value=(True, 2.0)), \
+                mock.patch("chatapi.ratelimit.time.sleep") as sleep:
+            self.assertTrue(ChatThrottle().allow_request(request, view))
+        return request, sleep
+
+    def test_sync_views_wait_in_the_throttle(self):
+        request, sleep = self.allow(streams_async=False)
+        sleep.assert_called_once_with(2.0)
+        self.assertFalse(hasattr(request, "admission_wait"))
+
+    def test_async_streams_wait_on_the_event_loop(self):
+        request, sleep = self.allow(streams_async=True)
+        sleep.assert_not_called()
+        self.assertEqual(request.admission_wait, 2.0)
+
+        async def events():
+            yield "chunk"
+
+        async def drain():
+            return [event async for event in after_admission(request.admission_wait, events())]
+
+        with mock.patch("chatapi.ratelimit.asyncio.sleep") as sleep:
+            self.assertEqual(asyncio.run(drain()), ["chunk"])
+        sleep.assert_awaited_once_with(2.0)
+
+
+
+class ConversationIdTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="student@example.com", password="x", username="student")
+        self.client.force_authenticate(self.user)
+
+    def test_rejected_before_the_model_is_called(self):
+        for conversation_id in ["x" * 101, 42, ["a"]]:
+            with mock.patch("chatapi.views.ask_phi") as ask_phi, self.assertLogs("django.request", "WARNING"):
+                response = self.client.post("/bot/chat/", {"prompt": "hi", "conversation_id": conversation_id}, format="json")
+            self.assertEqual(response.status_code, 400)
+            ask_phi.assert_not_called()
+
+    def test_longest_allowed_id(self):
+        with mock.patch("chatapi.views.ask_phi", return_value=iter(["hello"])):
+            response = self.client.post("/bot/chat/", {"prompt": "hi", "conversation_id": "x" * 100}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"response": "hello"})
+
+
+
+class VectorSearchTests(TestCase):
+    def test_missing_table_is_created_and_empty(self):
+        vector_db = scratch_vector_db(self)
+        self.assertEqual(vector_db.search("fees"), [])
+        self.assertTrue(vector_db.table_exists())
+
+    def test_dimension_mismatch_is_not_an_empty_result(self):
+        vector_db = scratch_vector_db(self, dimensions=8)
+        vector_db.create()
+        vector_db.insert([Document(name="fees", content="Tuition fees are due in August.", meta_data={})])
+        self.assertEqual([d.name for d in vector_db.search("tuition fees")], ["fees"])
+
+        wider = scratch_vector_db(self, collection=vector_db.collection, dimensions=16)
+        with self.assertLogs("chatapi.vectordb", "ERROR"), self.assertRaises(Exception):
+            wider.search("tuition fees")
+
+
+
+class AnswerCacheTests(TestCase):
+    def setUp(self):
+        self.cache = SemanticAnswerCache(LocalEmbedder(dimensions=256), threshold=0.9)
+        _, embedding = self.cache.lookup("What is the admission fee?")
+        self.cache.store("What is the admission fee?", embedding, "It is 5,000 rupees.")
+
+    def test_hit_and_miss(self):
+        self.assertEqual(self.cache.lookup("what is the admission fee")[0], "It is 5,000 rupees.")
+        answer, embedding = self.cache.lookup("Where is the library?")
+        self.assertIsNone(answer)
+        self.assertTrue(embedding)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_an_upload_invalidates_it(self):
+        job = enqueue_ingest(UploadRecord.objects.create(name="fees.pdf", content_hash="a" * 64))
+        stats = {"chunks": 3, "added": 1, "removed": 0, "failed": 0}
+        with mock.patch("chatapi.ingest.sync_pdf", return_value=stats), \
+                mock.patch("chatapi.ingest.build_reader"), mock.patch("chatapi.vectordb.build_vector_db"):
+            run_job(job)
+        self.assertEqual(KnowledgeBaseVersion.current(), 2)
+        self.assertFalse(CachedAnswer.objects.exists())
+        self.assertIsNone(self.cache.lookup("What is the admission fee?")[0])
+
+
+@override_settings(CHAT_ANSWER_CACHE_ENABLED=True)
+
+
+
+class AnswerCacheEligibilityTests(SimpleTestCase):
+    def setUp(self):
+        self.user = mock.Mock(pk=7)
+        cache = mock.Mock()
+        cache.lookup.return_value = ("cached", [1.0])
+        patcher = mock.patch("chatapi.utils.answer_cache", return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = cache
+
+    def test_only_context_free_questions_are_looked_up(self):
+        with mock.patch("chatapi.utils.has_personal_context", return_value=False):
+            self.assertEqual(lookup_cached_answer(self.user, "q", "default"), ("cached", [1.0]))
+        with mock.patch("chatapi.utils.has_personal_context", return_value=True):
+            self.assertEqual(lookup_cached_answer(self.user, "q", "default"), (None, None))
+
+    def test_answers_shaped_by_memories_are_not_stored(self):
+        agent = mock.Mock()
+        agent.memory.memories = ["studies computer science"]
+        agent.memory.summary = None
+        remember_answer("q", [1.0], "an answer", agent)
+        self.cache.store.assert_not_called()
+
+        agent.memory.memories = []
+        remember_answer("q", [1.0], "an answer", agent)
+        self.cache.store.assert_called_once_with("q", [1.0], "an answer")
+
+
+
+class CancelledStreamTests(SimpleTestCase):
+    def test_partial_answer_is_saved_when_the_client_goes_away(self):
+        resume = threading.Event()
+
+        def run(question, stream):
+            yield SimpleNamespace(content="Fees are ")
+            resume.wait(5)
+            yield SimpleNamespace(content="due in June.")
+
+        session = SimpleNamespace(lock=threading.Lock(), agent=mock.Mock(run=run))
+        user = SimpleNamespace(pk=7)
+        save = mock.AsyncMock()
+
+        async def disconnect_mid_stream():
+            sent = []
+
+            async def respond():
+                async for chunk in aask_phi(user, "When are fees due?"):
+                    sent.append(chunk)
+
+            task = asyncio.create_task(respond())
+            while not sent:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with mock.patch("chatapi.utils.lookup_cached_answer", return_value=(None, None)), \
+                mock.patch.object(utils.agent_pool, "get", return_value=session), \
+                mock.patch("chatapi.utils.asave_chat_turn", save):
+            asyncio.run(disconnect_mid_stream())
+            resume.set()
+
+        save.assert_awaited_once_with(user, "When are fees due?", "Fees are ", "default")
+        # the run's thread stops at the next chunk and hands the session back
+        self.assertTrue(session.lock.acquire(timeout=5))
+
+
+
+class SyncDocumentsTests(TestCase):
+    def setUp(self):
+        self.vector_db = scratch_vector_db(self)
+
+    def pages(self, *texts):
+        return [Document(name="fees", content=text, meta_data={"page": page}) for page, text in enumerate(texts, start=1)]
+
+    def sync(self, documents, **kwargs):
+        return sync_documents(self.vector_db, documents, "Fees 2024.pdf", "hash", **kwargs)
+
+    def rows(self):
+        table = self.vector_db.table
+        with self.vector_db.Session() as sess:
+            return sorted(sess.execute(select(table.c.name, table.c.content)).all())
+
+    def test_unchanged_reupload_embeds_nothing(self):
+        self.sync(self.pages("Tuition is due in August.", "Hostel fees are separate."))
+        stats = self.sync(self.pages("Tuition is due in August.", "Hostel fees are separate."))
+        self.assertEqual((stats["added"], stats["unchanged"], stats["removed"]), (0, 2, 0))
+        self.assertEqual(len(self.rows()), 2)
+
+    def test_changed_page_replaces_only_its_chunk(self):
+        self.sync(self.pages("Tuition is due in August.", "Hostel fees are separate."))
+        stats = self.sync(self.pages("Tuition is due in August.", "Hostel fees are included."))
+        self.assertEqual((stats["added"], stats["unchanged"], stats["removed"]), (1, 1, 1))
+        self.assertEqual([content for _, content in self.rows()],
+                         ["Hostel fees are included.", "Tuition is due in August."])
+
+    def test_legacy_rows_are_replaced_not_duplicated(self):
+        self.vector_db.create()
+        self.vector_db.insert([
+            Document(name="Fees_2024", content="Tuition is due in August.", meta_data={"page": 1}),
+            Document(name="Timetable", content="Classes start at 8.", meta_data={"page": 1}),
+        ])
+        record = UploadRecord.objects.create(name="Fees 2024.pdf", content_hash="a" * 64)
+        stats = self.sync(self.pages("Tuition is due in August."), legacy_names=legacy_names(record))
+        self.assertEqual(stats["removed"], 1)
+        self.assertEqual(self.rows(), [("Fees 2024.pdf", "Tuition is due in August."), ("Timetable", "Classes start at 8.")])
+
+
+
+class HistogramTests(SimpleTestCase):
+    def test_render(self):
+        histogram = Histogram("test_seconds", "Test timings.", ["stage"], buckets=(1, 0.1))
+        self.addCleanup(registry.remove, histogram)
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, stage="search")
+        histogram.observe(0.1, stage='say "hi"')
+        self.assertEqual(histogram.render(), [
+            "# HELP test_seconds Test timings.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{stage="say \\"hi\\"",le="0.1"} 1',
+            'test_seconds_bucket{stage="say \\"hi\\"",le="1.0"} 1',
+            'test_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 1',
+            'test_seconds_sum{stage="say \\"hi\\""} 0.1',
+            'test_seconds_count{stage="say \\"hi\\""} 1',
+            'test_seconds_bucket{stage="search",le="0.1"} 1',
+            'test_seconds_bucket{stage="search",le="1.0"} 2',
+            'test_seconds_bucket{stage="search",le="+Inf"} 3',
+            'test_seconds_sum{stage="search"} 5.55',
+            'test_seconds_count{stage="search"} 3',
+        ])
+
+
+
+class MetricsViewTests(SimpleTestCase):
+    def test_closed_without_a_token(self):
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_needs_the_bearer_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code, 403)
+        response = self.client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE", response.content)
+
+
+
+class UploadListETagTests(APITestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(email="admin@example.com", password="x", username="registrar", is_admin=True)
+        self.client.force_authenticate(self.admin)
+        UploadRecord.objects.create(name="fees.pdf", content_hash="a" * 64, uploaded_by=self.admin)
+
+    def revalidate(self, etag):
+        return self.client.get("/bot/file_records", headers={"If-None-Match": etag})
+
+    def test_unchanged_list_is_a_304(self):
+        first = self.client.get("/bot/file_records")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.revalidate(first["ETag"]).status_code, 304)
+        # a filter is a different list
+        self.assertEqual(self.client.get("/bot/file_records?uploaded_by=999", headers={"If-None-Match": first["ETag"]}).status_code, 200)
+
+    def test_new_upload_or_renamed_uploader_changes_it(self):
+        etag = self.client.get("/bot/file_records")["ETag"]
+        UploadRecord.objects.create(name="timetable.pdf", content_hash="b" * 64, uploaded_by=self.admin)
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.admin.username = "dean"
+        self.admin.save()
+        response = self.revalidate(response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row["admin_name"] for row in response.data["message"]}, {"dean"})
+
+
+
+class ChatStreamTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="student@example.com", password="x", username="student")
+        self.client.force_authenticate(self.user)
+
+    def stream(self, answer, **data):
+        with mock.patch("chatapi.views.ask_phi", return_value=answer):
+            response = self.client.post("/bot/chat/", {"prompt": "hi", "stream": True, **data}, format="json")
+            body = b"".join(response.streaming_content).decode()
+        return response, body
+
+    def test_chunks_then_done(self):
+        response, body = self.stream(iter(["Fees are ", "due in June. "]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["X-Accel-Buffering"], "no")
+        self.assertEqual(body, (
+            'event: chunk\ndata: {"content": "Fees are "}\n\n'
+            'event: chunk\ndata: {"content": "due in June. "}\n\n'
+            'event: done\ndata: {"response": "Fees are due in June."}\n\n'
+        ))
+
+    def test_a_failure_mid_stream_ends_with_an_error_event(self):
+        def answer():
+            yield "Fees are "
+            raise RuntimeError("model unavailable")
+
+        with self.assertLogs("chatapi.views", "ERROR"):
+            _, body = self.stream(answer())
+        self.assertEqual(body, (
+            'event: chunk\ndata: {"content": "Fees are "}\n\n'
+            'event: error\ndata: {"error": "model unavailable"}\n\n'
+        ))
+
+    def test_validation_errors_are_an_error_event(self):
+        with self.assertLogs("django.request", "WARNING"):
+            response = self.client.post("/bot/chat/", {}, format="json", headers={"Accept": "text/event-stream"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content, b'event: error\ndata: {"error": "prompt is required"}\n\n')
+
+
+
+class AsyncChatTests(TransactionTestCase):
+    # the async path hands its connection back after each ORM call, which a
+    # TestCase transaction doesn't survive
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="student@example.com", password="x", username="student")
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def answer(self, user, prompt, conversation_id):
+        yield "Fees are "
+        yield "due in June."
+
+    async def test_needs_a_valid_token(self):
+        response = await self.async_client.post("/bot/chat/async/", {"prompt": "hi"}, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.post("/bot/chat/async/", {"prompt": "hi"}, content_type="application/json",
+                                                headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_json_and_streamed_answers(self):
+        with mock.patch("chatapi.views.aadmit", mock.AsyncMock(return_value=None)), \
+                mock.patch("chatapi.views.aask_phi", self.answer):
+            response = await self.async_client.post("/bot/chat/async/", {"prompt": "hi"},
+                                                    content_type="application/json", headers=self.auth)
+            self.assertEqual(response.json(), {"response": "Fees are due in June."})
+
+            response = await self.async_client.post("/bot/chat/async/", {"prompt": "hi", "stream": True},
+                                                    content_type="application/json", headers=self.auth)
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertTrue(body.endswith('event: done\ndata: {"response": "Fees are due in June."}\n\n'))
+
+    async def test_throttled_requests_get_retry_after(self):
+        with mock.patch("chatapi.views.aadmit", mock.AsyncMock(return_value=3)):
+            response = await self.async_client.post("/bot/chat/async/", {"prompt": "hi"},
+                                                    content_type="application/json", headers=self.auth)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+
+
+
+class LLMSemaphoreTests(SimpleTestCase):
+    @override_settings(CHAT_MAX_INFLIGHT_LLM_CALLS=2)
+    def test_bounds_concurrent_runs_across_users(self):
+        running = []
+        peak = []
+        guard = threading.Lock()
+
+        def run(question, stream):
+            with guard:
+                running.append(question)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with guard:
+                running.remove(question)
+            yield SimpleNamespace(content=f"answer to {question}")
+
+        sessions = {pk: SimpleNamespace(lock=threading.Lock(), agent=SimpleNamespace(run=run, run_response=None)) for pk in range(5)}
+
+        async def ask(pk):
+            return [chunk async for chunk in aask_phi(SimpleNamespace(pk=pk), f"q{pk}")]
+
+        async def ask_everyone():
+            self.assertIs(llm_semaphore(), llm_semaphore())
+            return await asyncio.gather(*(ask(pk) for pk in sessions))
+
+        with mock.patch("chatapi.utils.lookup_cached_answer", return_value=(None, None)), \
+                mock.patch.object(utils.agent_pool, "get", lambda pk, conversation_id: sessions[pk]), \
+                mock.patch("chatapi.utils.remember_answer"), \
+                mock.patch("chatapi.utils.asave_chat_turn", mock.AsyncMock()), \
+                mock.patch("chatapi.utils.record_turn"):
+            answers = asyncio.run(ask_everyone())
+
+        self.assertEqual(answers, [[f"answer to q{pk}"] for pk in sessions])
+        self.assertEqual(max(peak), 2)
+
+
+
+class AgentPoolTests(SimpleTestCase):
+    def pool(self, **kwargs):
+        return AgentPool(lambda user_id, session_id: session_id, **kwargs)
+
+    def test_overflow_evicts_the_least_recently_used(self):
+        pool = self.pool(max_sessions=2, idle_timeout=0)
+        first = pool.get(1, "a")
+        second = pool.get(1, "b")
+        self.assertIs(pool.get(1, "a"), first)
+        pool.get(1, "c")
+        self.assertEqual(len(pool), 2)
+        self.assertIs(pool.get(1, "a"), first)
+        self.assertIsNot(pool.get(1, "b"), second)
+        self.assertEqual(pool.get(2, "x").agent, "2:x")
+
+    def test_sessions_with_a_run_in_flight_are_kept(self):
+        pool = self.pool(max_sessions=1, idle_timeout=0)
+        busy = pool.get(1, "a")
+        with busy.lock:
+            pool.get(1, "b")
+            self.assertIs(pool.get(1, "a"), busy)
+
+    def test_idle_sessions_expire(self):
+        clock = [0.0]
+        with mock.patch("chatapi.agent_pool.time.monotonic", lambda: clock[0]):
+            pool = self.pool(idle_timeout=60)
+            session = pool.get(1, "a")
+            clock[0] = 50
+            self.assertIs(pool.get(1, "a"), session)
+            clock[0] = 200
+            self.assertIsNot(pool.get(1, "a"), session)
+
+
+
+class CachingEmbedderTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(LocalEmbedder, "get_embeddings", autospec=True, side_effect=LocalEmbedder.get_embeddings)
+        self.embed = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def embedder(self, dimensions=8):
+        return CachingEmbedder(embedder=LocalEmbedder(dimensions=dimensions))
+
+    def test_each_text_is_embedded_once(self):
+        embedder = self.embedder()
+        first = embedder.get_embeddings(["Fees are due", "Fees  are due\n", "Classes start at 8"])
+        self.assertEqual(self.embed.call_args.args[1], ["Fees are due", "Classes start at 8"])
+        self.assertEqual(first[0], first[1])
+
+        self.assertEqual(embedder.get_embeddings(["Classes start at 8", "Fees are due"]), [first[2], first[0]])
+        self.assertEqual(self.embed.call_count, 1)
+
+    def test_vectors_outlive_the_process_cache(self):
+        vectors = self.embedder().get_embeddings(["Fees are due"])
+        self.assertEqual(EmbeddingCache.objects.count(), 1)
+        # pgvector keeps single precision
+        for stored, fresh in zip(self.embedder().get_embeddings(["Fees are due"])[0], vectors[0]):
+            self.assertAlmostEqual(stored, fresh, places=6)
+        self.assertEqual(self.embed.call_count, 1)
+
+    def test_other_dimensions_are_a_different_entry(self):
+        self.embedder(dimensions=8).get_embeddings(["Fees are due"])
+        self.assertEqual(len(self.embedder(dimensions=16).get_embeddings(["Fees are due"])[0]), 16)
+        self.assertEqual(EmbeddingCache.objects.count(), 2)
+
+
+
+class UploadDedupTests(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        admin = get_user_model().objects.create_user(email="admin@example.com", password="x", username="registrar", is_admin=True)
+        self.client.force_authenticate(admin)
+
+    def upload(self, name, content):
+        return self.client.post("/bot/upload_file/", {"file": SimpleUploadedFile(name, content, "application/pdf")})
+
+    def test_same_file_again_is_not_queued(self):
+        self.assertEqual(self.upload("fees.pdf", b"%PDF fees").status_code, 202)
+        response = self.upload("Fees copy.pdf", b"%PDF fees")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["file"], "fees.pdf")
+        self.assertEqual(IngestJob.objects.count(), 1)
+
+    def test_replaced_or_failed_uploads_are_queued_again(self):
+        self.upload("fees.pdf", b"%PDF fees 2024")
+        self.upload("fees.pdf", b"%PDF fees 2025")
+        # the index now holds the 2025 version for this name
+        self.assertEqual(self.upload("fees.pdf", b"%PDF fees 2024").status_code, 202)
+
+        IngestJob.objects.update(status=IngestJob.FAILED)
+        self.assertEqual(self.upload("fees.pdf", b"%PDF fees 2024").status_code, 202)
+        self.assertEqual(IngestJob.objects.count(), 4)
+
+
+
+class IngestJobTests(APITestCase):
+    def setUp(self):
+        self.record = UploadRecord.objects.create(name="fees.pdf", content_hash="a" * 64)
+        self.job = enqueue_ingest(self.record)
+
+    def run_job(self, sync_pdf):
+        with mock.patch("chatapi.ingest.sync_pdf", sync_pdf), mock.patch("chatapi.ingest.build_reader"), \
+                mock.patch("chatapi.vectordb.build_vector_db"):
+            return run_job(claim_next_job())
+
+    def test_queued_running_done(self):
+        later = enqueue_ingest(UploadRecord.objects.create(name="timetable.pdf", content_hash="b" * 64))
+        seen = []
+
+        def sync_pdf(record, vector_db, reader, progress):
+            seen.append(IngestJob.objects.get(record=record).status)
+            progress(pages_parsed=3, chunks_total=5, chunks_embedded=5)
+            return {"chunks": 5, "added": 5, "removed": 0, "failed": 0}
+
+        job = self.run_job(sync_pdf)
+        self.assertEqual((job.pk, seen), (self.job.pk, [IngestJob.RUNNING]))
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.pages_parsed, self.job.chunks_embedded), (IngestJob.DONE, 3, 5))
+        self.assertIsNotNone(self.job.finished_at)
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.chunk_count, 5)
+        # the next claim takes the next job in line, then there is none
+        self.assertEqual(claim_next_job().pk, later.pk)
+        self.assertIsNone(claim_next_job())
+
+    def test_failures_are_reported(self):
+        with self.assertLogs("chatapi.jobs", "ERROR"):
+            job = self.run_job(mock.Mock(side_effect=ValueError("not a PDF")))
+        self.assertEqual((job.status, job.error), (IngestJob.FAILED, "not a PDF"))
+
+        retry = enqueue_ingest(self.record)
+        job = self.run_job(mock.Mock(return_value={"chunks": 5, "added": 3, "removed": 0, "failed": 2}))
+        self.assertEqual((job.pk, job.status, job.error), (retry.pk, IngestJob.FAILED, "2 chunks could not be embedded"))
+
+    @override_settings(INGEST_JOB_STALE_SECONDS=60)
+    def test_a_dead_worker_job_is_claimed_again(self):
+        claim_next_job()
+        self.assertIsNone(claim_next_job())
+        IngestJob.objects.filter(pk=self.job.pk).update(updated_at=timezone.now() - timedelta(seconds=61))
+        job = claim_next_job()
+        self.assertEqual((job.pk, job.status), (self.job.pk, IngestJob.RUNNING))
+
+    def test_status_endpoint(self):
+        admin = get_user_model().objects.create_user(email="admin@example.com", password="x", username="registrar", is_admin=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(f"/bot/upload_jobs/{self.job.pk}/")
+        self.assertEqual(response.data["data"]["status"], IngestJob.QUEUED)
+        self.assertEqual(response.data["data"]["file"], "fees.pdf")
+        self.assertEqual(self.client.get("/bot/upload_jobs/999999/").status_code, 404)
+
+
+
+class PageStreamingTests(SimpleTestCase):
+    PAGES = ["Admissions", "", "Fees", "Hostels", "  ", "Transport", "Library"]
+
+    def setUp(self):
+        self.submitted = []
+        for target, value in [
+            ("pypdf.PdfReader", lambda path: SimpleNamespace(pages=self.PAGES)),
+            ("chatapi.ingest.extract_page_batch", self.extract),
+            ("chatapi.ingest.page_pool", lambda: SimpleNamespace(submit=self.submit)),
+        ]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def extract(self, path, start, stop):
+        return [(number + 1, self.PAGES[number]) for number in range(start, stop)]
+
+    def submit(self, function, path, start, stop):
+        self.submitted.append(start)
+        future = Future()
+        future.set_result(function(path, start, stop))
+        return future
+
+    @override_settings(INGEST_PDF_PAGE_BATCH=2, INGEST_PDF_WORKERS=1)
+    def test_batches_are_read_ahead_a_bounded_amount(self):
+        pages = SafePDFReader().iter_pages_parallel("fees.pdf")
+        self.assertEqual(next(pages), (1, "Admissions"))
+        # two batches per worker in flight, the next goes out once one is used up
+        self.assertEqual(self.submitted, [0, 2])
+        self.assertEqual(next(pages), (2, ""))
+        self.assertEqual(self.submitted, [0, 2])
+        self.assertEqual(next(pages), (3, "Fees"))
+        self.assertEqual(self.submitted, [0, 2, 4])
+        self.assertEqual([number for number, _ in pages], [4, 5, 6, 7])
+        self.assertEqual(self.submitted, [0, 2, 4, 6])
+
+    @override_settings(INGEST_PDF_PAGE_BATCH=2, INGEST_PDF_WORKERS=1)
+    def test_empty_pages_are_dropped_in_page_order(self):
+        documents = list(SafePDFReader(chunk=False).iter_read("media/pdfs/Fees 2024.pdf"))
+        self.assertEqual([document.id for document in documents],
+                         ["Fees_2024_1", "Fees_2024_3", "Fees_2024_4", "Fees_2024_6", "Fees_2024_7"])
+        self.assertEqual(documents[1].meta_data, {"page": 3})
+
+
+
+class TokenBudgetTests(SimpleTestCase):
+    def test_waits_for_the_refill(self):
+        clock = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        with mock.patch("chatapi.embedding.time.monotonic", lambda: clock[0]), \
+                mock.patch("chatapi.embedding.time.sleep", sleep):
+            budget = TokenBudget(tokens_per_minute=600)
+            budget.acquire(600)
+            self.assertEqual(sleeps, [])
+            # 10 tokens a second
+            budget.acquire(60)
+            self.assertEqual(sleeps, [6.0])
+            # capped at the bucket size, it could never fill up otherwise
+            budget.acquire(10_000)
+            self.assertEqual(sleeps[-1], 60.0)
+
+    def test_zero_disables_it(self):
+        with mock.patch("chatapi.embedding.time.sleep") as sleep:
+            TokenBudget(0).acquire(10 ** 9)
+        sleep.assert_not_called()
+
+
+
+class IndexMaintenanceTests(TestCase):
+    def documents(self, *texts):
+        return [Document(name="fees", content=text, meta_data={}) for text in texts]
+
+    def test_hnsw_is_created_once(self):
+        vector_db = scratch_vector_db(self, index=HNSW(name="test_hnsw_idx"))
+        vector_db.create()
+        self.assertEqual(vector_db.maintain_index(), "created")
+        self.assertEqual(vector_db.maintain_index(), None)
+        info = vector_db.index_info()
+        self.assertEqual((info["name"], info["method"], info["valid"]), ("test_hnsw_idx", "hnsw", True))
+
+    def test_ivfflat_is_rebuilt_once_the_table_doubled(self):
+        vector_db = scratch_vector_db(self, index=Ivfflat(name="test_ivfflat_idx", dynamic_lists=True), rebuild_growth=2.0)
+        vector_db.create()
+        vector_db.insert(self.documents("Tuition is due in August.", "Hostel fees are separate."))
+        self.assertEqual(vector_db.maintain_index(), "created")
+        vector_db.insert(self.documents("Classes start at 8."))
+        self.assertEqual(vector_db.maintain_index(), None)
+        vector_db.insert(self.documents("The library opens at 9."))
+        self.assertEqual(vector_db.maintain_index(), "rebuilt")
+        self.assertEqual(vector_db.index_info()["build"], {"rows": 4})
+
+    def test_a_different_index_type_replaces_the_old_one(self):
+        vector_db = scratch_vector_db(self, index=Ivfflat(name="test_ivfflat_idx", dynamic_lists=True))
+        vector_db.create()
+        vector_db.maintain_index()
+        switched = scratch_vector_db(self, collection=vector_db.collection, index=HNSW(name="test_hnsw_idx"))
+        self.assertEqual(switched.maintain_index(), "rebuilt")
+        self.assertEqual([info["name"] for info in switched.ann_indexes()], ["test_hnsw_idx"])
+
+
+
+class HybridSearchTests(TestCase):
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60)
+        # ids in both lists beat a first place in one; 1/61 + 1/63 edges out 2/62
+        self.assertEqual(fused, ["c", "b", "a", "d"])
+        self.assertEqual(reciprocal_rank_fusion([["a", "b"], ["b"]], limit=1), ["b"])
+        self.assertEqual(reciprocal_rank_fusion([]), [])
+
+    def test_text_search_finds_exact_terms(self):
+        vector_db = scratch_vector_db(self, search_mode="hybrid")
+        vector_db.create()
+        vector_db.insert([
+            Document(name="fees", content="Tuition is due in August.", meta_data={}),
+            Document(name="codes", content="The course code for databases is BSCS-512.", meta_data={}),
+        ])
+        self.assertEqual([d.name for d in vector_db.search("BSCS-512", mode="text")], ["codes"])
+        self.assertEqual(vector_db.search("BSCS-512", limit=1)[0].name, "codes")
+
+
+
+class RerankingTests(FallbackTokenizerMixin, SimpleTestCase):
+    def test_mmr_drops_near_duplicates_and_keeps_rank_order(self):
+        documents = [
+            Document(name="a", content="a", embedding=[1.0, 0.0]),
+            Document(name="a-copy", content="a", embedding=[0.99, 0.01]),
+            Document(name="b", content="b", embedding=[0.0, 1.0]),
+            Document(name="c", content="c", embedding=[0.7, 0.7]),
+        ]
+        self.assertEqual([d.name for d in mmr(documents, k=3)], ["a", "b", "c"])
+        self.assertEqual([d.name for d in mmr(documents, k=1)], ["a"])
+        self.assertEqual(mmr(documents[:1], k=3), documents[:1])
+
+    def test_pack_skips_what_does_not_fit(self):
+        small, big, other = (Document(name=name, content="x" * size) for name, size in [("small", 40), ("big", 400), ("other", 40)])
+        self.assertEqual([d.name for d in pack([small, big, other], max_tokens=30)], ["small", "other"])
+        # the first document is kept whatever its size
+        self.assertEqual([d.name for d in pack([big, small], max_tokens=30)], ["big"])
+
+
+
+class ConnectionPoolTests(TestCase):
+    def setUp(self):
+        self.url = test_database_url()
+        # the test database can only be dropped once the engines let go of it
+        self.addCleanup(dispose_engines)
+
+    def test_one_pooled_engine_per_url(self):
+        engine = get_engine(self.url)
+        self.assertIs(get_engine(self.url), engine)
+        self.assertEqual(engine.pool.size(), settings.SQLALCHEMY_ENGINE_OPTIONS["pool_size"])
+        with engine.connect(), engine.connect():
+            self.assertEqual(engine.pool.checkedout(), 2)
+        # handed back, not closed
+        self.assertEqual((engine.pool.checkedout(), engine.pool.checkedin()), (0, 2))
+
+    def test_phi_components_share_it(self):
+        with override_settings(SQLALCHEMY_DATABASE_URL=self.url):
+            engine = get_engine()
+            vector_db = build_vector_db("test_shared_engine", embedder=LocalEmbedder(dimensions=8), index=None)
+            self.assertIs(vector_db.db_engine, engine)
+            # the unwrapped factories, the accessors keep what they built first
+            self.assertIs(utils.memory_db.__wrapped__().db_engine, engine)
+            self.assertIs(utils.agent_storage.__wrapped__().db_engine, engine)
+
+    @skipUnless(settings.DB_POOL, "DB_POOL is off")
+    def test_django_connections_come_from_the_psycopg_pool(self):
+        self.assertIsNotNone(connection.pool)
+        self.assertEqual(connection.pool.max_size, settings.DATABASES["default"]["OPTIONS"]["pool"]["max_size"])
+
+
+
+class WarmUpTests(SimpleTestCase):
+    STEPS = ["openai_clients", "knowledge_base", "knowledge_retriever", "memory_db", "agent_storage", "answer_cache", "build_agent"]
+
+    def test_every_step_runs_and_a_failing_one_is_skipped(self):
+        patchers = [mock.patch(f"chatapi.utils.{name}") for name in self.STEPS] + [
+            mock.patch("chatapi.db.get_engine"),
+            mock.patch("chatapi.chunking.count_tokens"),
+            mock.patch.object(connection, "ensure_connection"),
+        ]
+        mocks = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        utils.openai_clients.side_effect = RuntimeError("no network")
+
+        with self.assertLogs("chatapi.utils", "ERROR") as logs:
+            timings = utils.warm_up()
+        self.assertIn("Warm-up step openai_clients failed", logs.output[0])
+        self.assertEqual(list(timings), ["database", "sqlalchemy_pool", "openai_clients", "knowledge_base", "retriever",
+                                         "memory_db", "agent_storage", "answer_cache", "tokenizer", "agent"])
+        for step in mocks:
+            self.assertTrue(step.called)
+        utils.build_agent.assert_called_once_with(user_id="warmup", session_id="warmup")
+
+    def test_runs_in_the_background_only_when_enabled(self):
+        done = threading.Event()
+        with mock.patch("chatapi.utils.warm_up", side_effect=done.set) as warm_up:
+            with override_settings(CHAT_WARM_UP_ON_STARTUP=False):
+                utils.start_warm_up()
+            warm_up.assert_not_called()
+            with override_settings(CHAT_WARM_UP_ON_STARTUP=True):
+                utils.start_warm_up()
+            self.assertTrue(done.wait(5))
+
+    def test_the_server_entry_points_start_it(self):
+        for module in ("Chatbot.asgi", "Chatbot.wsgi"):
+            with mock.patch("chatapi.utils.start_warm_up") as start_warm_up, \
+                    mock.patch.dict(sys.modules, {module: None}):
+                del sys.modules[module]
+                importlib.import_module(module)
+            start_warm_up.assert_called_once_with()
+
+
+
+class ChatHistoryPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="student@example.com", password="x", username="student")
+        self.client.force_authenticate(self.user)
+        for turn in range(5):
+            utils.save_chat_turn(self.user, f"question {turn}", f"answer {turn}")
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [message["content"] for message in response.data["data"]], response.data["next"]
+
+    def test_pages_walk_back_in_time_and_read_top_to_bottom(self):
+        newest, next_url = self.page("/bot/chat-data/?page_size=4")
+        self.assertEqual(newest, ["question 3", "answer 3", "question 4", "answer 4"])
+        # a turn saved while paging doesn't shift the older pages
+        utils.save_chat_turn(self.user, "question 5", "answer 5")
+        older, next_url = self.page(next_url)
+        self.assertEqual(older, ["question 1", "answer 1", "question 2", "answer 2"])
+        oldest, next_url = self.page(next_url)
+        self.assertEqual((oldest, next_url), (["question 0", "answer 0"], None))
+
+    def test_only_the_requested_conversation(self):
+        other = get_user_model().objects.create_user(email="other@example.com", password="x", username="other")
+        utils.save_chat_turn(other, "someone else's question", "their answer")
+        utils.save_chat_turn(self.user, "about hostels", "hostel answer", conversation_id="hostels")
+        self.assertEqual(self.page("/bot/chat-data/?conversation_id=hostels")[0], ["about hostels", "hostel answer"])
+        self.assertEqual(len(self.page("/bot/chat-data/")[0]), 10)
+        self.assertEqual(self.page("/bot/chat-data/?conversation_id=missing")[0], [])
+
+        response = self.client.get("/bot/conversations/")
+        self.assertEqual([c["conversation_id"] for c in response.data["data"]], ["hostels", "default"])
+
+    def test_a_bad_cursor_is_a_400(self):
+        self.assertEqual(self.client.get("/bot/chat-data/?cursor=bogus").status_code, 400)
+
+
+
+class MemoryUpdaterTests(SimpleTestCase):
+    def test_turns_are_batched_per_user(self):
+        remembered, summarized = [], []
+        updater = MemoryUpdater(
+            remember=lambda user_id, questions: remembered.append((user_id, questions)),
+            summarize=lambda user_id, conversation_id: summarized.append((user_id, conversation_id)),
+            summary_every=2,
+            delay=60,
+        )
+        updater.record_turn(1, "a", "q1")
+        updater.record_turn(1, "b", "q2")
+        updater.record_turn(2, "a", "q3")
+        updater.record_turn(1, "a", "q4")
+        # flush cuts the delay short
+        self.assertTrue(updater.flush(timeout=5))
+        self.assertEqual(sorted(remembered), [("1", ["q1", "q2", "q4"]), ("2", ["q3"])])
+        self.assertEqual(summarized, [("1", "a")])
+
+    def test_a_failing_update_does_not_stop_the_worker(self):
+        calls = []
+
+        def remember(user_id, questions):
+            calls.append(questions)
+            if len(calls) == 1:
+                raise RuntimeError("memory db down")
+
+        updater = MemoryUpdater(remember=remember, summarize=lambda *args: None, delay=0)
+        with self.assertLogs("chatapi.memory_updates", "ERROR"):
+            updater.record_turn(1, "a", "q1")
+            self.assertTrue(updater.flush(timeout=5))
+        updater.record_turn(1, "a", "q2")
+        self.assertTrue(updater.flush(timeout=5))
+        self.assertEqual(calls, [["q1"], ["q2"]])
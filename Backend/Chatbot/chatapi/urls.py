@@ -1,11 +1,14 @@
-from .views import ChatBotAPIView,UploadFileView,UploadedDataListView,GetChatDataView
+from .views import ChatBotAPIView,AsyncChatBotView,UploadFileView,IngestJobStatusView,UploadedDataListView,GetChatDataView,ConversationListView
 from django.urls import path
 from rest_framework_simplejwt.views import TokenVerifyView
 
 urlpatterns = [
     path('chat/',ChatBotAPIView.as_view(), name = 'chatbotresponse'), 
+    path('chat/async/',AsyncChatBotView.as_view(), name = 'chatbotresponse_async'),
     path('upload_file/',UploadFileView.as_view(), name = 'uploadfile'),
+    path('upload_jobs/<int:job_id>/',IngestJobStatusView.as_view(), name = 'ingest_job_status'),
     path('chat-data/',GetChatDataView.as_view(), name = 'chatdata'),
+    path('conversations/',ConversationListView.as_view(), name = 'conversations'),
     path('file_records',UploadedDataListView.as_view(), name= 'record_list'), 
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),  
 ]
\ No newline at end of file
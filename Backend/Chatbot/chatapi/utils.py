@@ -1,14 +1,22 @@
-
 import os
-from phi.knowledge.pdf import PDFKnowledgeBase, PDFReader
-from phi.vectordb.pgvector import PgVector2
-from phi.agent import Agent,AgentMemory
-from .models import ChatMessage
-from phi.document.chunking.document import DocumentChunking
-from .embedding import openai_embedder
-from phi.storage.agent.postgres import PgAgentStorage 
-from phi.memory.db.postgres import PgMemoryDb
-from phi.model.openai import OpenAIChat
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import ChatMessage, Conversation
+from .agent_pool import AgentPool
+from .db import database_sync_to_async
+from .memory_updates import MemoryUpdater
+from .metrics import StreamTimer, count_tokens_used, span, trace
+from .streaming import ThreadedStream
+
+# phi, openai, SQLAlchemy and pgvector are imported where they are first
+# needed: importing them costs about a second, and every manage.py command
+# imports this module through the URLconf.
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,31 +26,53 @@ PDF_DIR = os.path.join(BASE_DIR, "media", "pdfs")
 
 open_api_key = os.environ.get("OPENAI_API_KEY")
 
+logger = logging.getLogger(__name__)
 
-class SafePDFReader(PDFReader):
-    def read(self, pdf: str):
-        documents = super().read(pdf=pdf)
+NO_INFO_ANSWER = "I don't have information about that"
 
-        # filter empty documents
-        safe_docs = []
-        for doc in documents:
-            if doc.content and doc.content.strip():
-                safe_docs.append(doc)
 
-        print(f"Loaded {len(safe_docs)} non-empty chunks")
-        return safe_docs
+def lazy(factory):
+    """Turns a zero-argument factory into a thread-safe accessor that builds once."""
+    built = []
+    lock = threading.Lock()
 
+    @wraps(factory)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
 
-pdf_knowledge_base = PDFKnowledgeBase(
-    path=PDF_DIR,
-    vector_db=PgVector2(
-        collection="UoK_Data",
-        db_url="postgresql+psycopg://ai:ai@localhost:5532/ai",
-        embedder=openai_embedder
-        
-    ),
-    reader=SafePDFReader(chunk=True,chunking_strategy = DocumentChunking(chunk_size=5000, overlap=150)),
-)
+    get.is_built = lambda: bool(built)
+    return get
+
+
+@lazy
+def knowledge_base():
+    from phi.knowledge.pdf import PDFKnowledgeBase
+    from .ingest import build_reader
+    from .vectordb import build_vector_db
+
+    return PDFKnowledgeBase(
+        path=PDF_DIR,
+        vector_db=build_vector_db(settings.KNOWLEDGE_COLLECTION),
+        reader=build_reader(settings.KNOWLEDGE_COLLECTION),
+        num_documents=settings.KNOWLEDGE_NUM_DOCUMENTS,
+    )
+
+
+@lazy
+def knowledge_retriever():
+    from .retrieval import KnowledgeRetriever
+
+    return KnowledgeRetriever(
+        knowledge_base(),
+        num_documents=settings.KNOWLEDGE_NUM_DOCUMENTS,
+        candidates=settings.KNOWLEDGE_MMR_CANDIDATES,
+        lambda_mult=settings.KNOWLEDGE_MMR_LAMBDA,
+        max_tokens=settings.KNOWLEDGE_CONTEXT_TOKENS,
+    )
 
 
 
@@ -62,44 +92,418 @@ instructions = [
 
 
 
-agent = Agent(
-    model=OpenAIChat(id="gpt-4o"),
-    memory=AgentMemory(
-        db=PgMemoryDb(table_name="agent_memory", db_url="postgresql+psycopg://ai:ai@localhost:5532/ai"),
+@lazy
+def memory_db():
+    from phi.memory.db.postgres import PgMemoryDb
+    from .db import get_engine
+
+    return PgMemoryDb(table_name="agent_memory", db_engine=get_engine())
+
+
+@lazy
+def agent_storage():
+    from phi.storage.agent.postgres import PgAgentStorage
+    from .db import get_engine
+
+    return PgAgentStorage(table_name="University_of_Karachi", db_engine=get_engine())
+
+
+@lazy
+def openai_clients():
+    # one sync + one async OpenAI client (and their HTTP pools) for every
+    # session agent; built on first use so imports don't need an API key
+    from openai import OpenAI, AsyncOpenAI
+
+    return {
+        "client": OpenAI(api_key=open_api_key),
+        "async_client": AsyncOpenAI(api_key=open_api_key),
+    }
+
+
+def chat_model():
+    from phi.model.openai import OpenAIChat
+
+    return OpenAIChat(id="gpt-4o", **openai_clients())
+
+
+def build_agent(user_id, session_id):
+    from phi.agent import Agent, AgentMemory
+
+    # with background updates on, memories and summaries are written by
+    # memory_updater after the answer is out, not at the end of agent.run
+    after_run = not settings.CHAT_MEMORY_UPDATES_IN_BACKGROUND
+    return Agent(
+        model=chat_model(),
+        memory=AgentMemory(
+            db=memory_db(),
+            create_user_memories=True,
+            update_user_memories_after_run=after_run,
+            create_session_summary=True,
+            update_session_summary_after_run=after_run,
+        ),
+        storage=agent_storage(),
+        knowledge_base=knowledge_base(),
+        retriever=knowledge_retriever(),
+        user_id=user_id,
+        session_id=session_id,
+        description=description,
+        instructions=instructions,
+        markdown=True,
+        stream=True,
+        use_knowledge=True,
+        search_knowledge=True,
+        prevent_hallucinations=True,
+    )
+
+
+agent_pool = AgentPool(
+    build_agent,
+    max_sessions=settings.CHAT_AGENT_POOL_SIZE,
+    idle_timeout=settings.CHAT_AGENT_IDLE_SECONDS,
+)
+
+
+def remember_questions(user_id, questions):
+    """One classifier (and, if needed, memory manager) call for a batch of a user's questions."""
+    from phi.memory.agent import AgentMemory
+    from phi.memory.classifier import MemoryClassifier
+    from phi.memory.manager import MemoryManager
+
+    memory = AgentMemory(
+        db=memory_db(),
+        user_id=user_id,
         create_user_memories=True,
-        create_session_summary=True
-    ),
-    storage=PgAgentStorage(table_name="University_of_Karachi", db_url="postgresql+psycopg://ai:ai@localhost:5532/ai"),
-    knowledge_base=pdf_knowledge_base,
-    api_key = open_api_key,
-    description=description,
-    instructions=instructions,
-    markdown=True,
-    stream=True,
-    use_knowledge=True,
-    search_knowledge=True,
-    prevent_hallucinations=True,
+        classifier=MemoryClassifier(model=chat_model()),
+        manager=MemoryManager(model=chat_model(), user_id=user_id, db=memory_db()),
+    )
+    memory.load_user_memories()
+    memory.update_memory(input="\n\n".join(questions))
+
+
+def refresh_summary(user_id, conversation_id):
+    from phi.memory.summarizer import MemorySummarizer
+
+    session = agent_pool.get(user_id, conversation_id)
+    with session.lock:
+        session.agent.read_from_storage()
+        message_pairs = session.agent.memory.get_message_pairs()
+    # the summary call runs without the lock, the conversation can go on meanwhile
+    summary = MemorySummarizer(model=chat_model()).run(message_pairs)
+    if summary is None:
+        return
+    with session.lock:
+        # re-read so turns taken while summarizing are kept
+        session.agent.read_from_storage()
+        session.agent.memory.summary = summary
+        session.agent.write_to_storage()
+
 
+memory_updater = MemoryUpdater(
+    remember_questions,
+    refresh_summary,
+    summary_every=settings.CHAT_SUMMARY_EVERY_TURNS,
+    delay=settings.CHAT_MEMORY_BATCH_SECONDS,
 )
 
 
-def ask_phi(user, question):
-    full_response = ""
+def record_turn(user, conversation_id, question):
+    if settings.CHAT_MEMORY_UPDATES_IN_BACKGROUND:
+        memory_updater.record_turn(user.pk, conversation_id, question)
+
+
+@lazy
+def answer_cache():
+    from .answer_cache import SemanticAnswerCache
+    from .embedding import embedder
+
+    return SemanticAnswerCache(
+        embedder,
+        threshold=settings.CHAT_ANSWER_CACHE_THRESHOLD,
+        ttl=settings.CHAT_ANSWER_CACHE_TTL,
+    )
+
+
+def has_personal_context(user, conversation_id):
+    """
+    Whether the agent's prompt for this user and conversation carries
+    anything of their own: stored memories or a session summary. Earlier
+    turns are not sent (the agent doesn't add chat history).
+    """
+    if memory_db().read_memories(user_id=str(user.pk), limit=1):
+        return True
+    # the session id AgentPool gives the conversation's agent
+    session = agent_storage().read(session_id=f"{user.pk}:{conversation_id}")
+    return bool(session and (session.memory or {}).get("summary"))
+
+
+def used_personal_context(agent):
+    return bool(agent.memory.memories) or agent.memory.summary is not None
+
+
+def lookup_cached_answer(user, question, conversation_id="default"):
+    """
+    The cache is shared by all users, so only questions whose prompt would
+    be the same for anyone are looked up. The embedding comes back only for
+    those, so answers shaped by a user's memories are never stored either.
+    """
+    if not settings.CHAT_ANSWER_CACHE_ENABLED:
+        return None, None
+    try:
+        if has_personal_context(user, conversation_id):
+            return None, None
+        return answer_cache().lookup(question)
+    except Exception:
+        # a broken cache must never take the chat down with it
+        logger.exception("Answer cache lookup failed")
+        return None, None
+
 
-    
-    for chunk in agent.run(question, stream=True):
+def remember_answer(question, embedding, answer, agent):
+    if not embedding or answer.strip().startswith(NO_INFO_ANSWER):
+        return
+    try:
+        # a memory may have been written between the lookup and the run
+        if used_personal_context(agent):
+            return
+        answer_cache().store(question, embedding, answer.strip())
+    except Exception:
+        logger.exception("Answer cache store failed")
+
+
+def store_cached_turn(user, conversation_id, question, answer):
+    """Adds a turn answered from the cache to the agent session, as agent.run would have."""
+    from phi.memory.agent import AgentRun
+    from phi.model.message import Message
+    from phi.run.response import RunResponse
+
+    messages = [Message(role="user", content=question), Message(role="assistant", content=answer)]
+    session = agent_pool.get(user.pk, conversation_id)
+    try:
+        with session.lock:
+            session.agent.read_from_storage()
+            session.agent.memory.add_run(AgentRun(message=messages[0],
+                                                  response=RunResponse(content=answer, messages=messages)))
+            session.agent.write_to_storage()
+    except Exception:
+        logger.exception("Could not add cached turn to session %s:%s", user.pk, conversation_id)
+
+
+# one INSERT .. ON CONFLICT per turn: a new conversation takes its title from
+# the first question, an existing one only gets its updated_at bumped
+CONVERSATION_UPSERT = dict(update_conflicts=True, unique_fields=["user", "key"], update_fields=["updated_at"])
+
+
+def chat_turn(user, conversation, question, answer):
+    return [
+        ChatMessage(user=user, conversation=conversation, role="user", content=question),
+        ChatMessage(user=user, conversation=conversation, role="assistant", content=answer.strip()),
+    ]
+
+
+def save_chat_turn(user, question, answer, conversation_id="default"):
+    conversation = Conversation(user=user, key=conversation_id, title=question.strip()[:255])
+    Conversation.objects.bulk_create([conversation], **CONVERSATION_UPSERT)
+    ChatMessage.objects.bulk_create(chat_turn(user, conversation, question, answer))
+
+
+def record_usage(agent):
+    # phi aggregates usage per assistant message of the run into lists
+    usage = getattr(agent.run_response, "metrics", None) or {}
+    count_tokens_used("prompt", sum(usage.get("input_tokens") or []))
+    count_tokens_used("completion", sum(usage.get("output_tokens") or []))
+
+
+def stream_agent_run(session, question):
+    """Streams the answer of one agent run; the caller holds ``session.lock``."""
+    timer = StreamTimer()
+    for chunk in session.agent.run(question, stream=True):
         content = getattr(chunk, "content", None)
         if content:
-            content = content.replace("<br>", "\n")
-            full_response += content
-            yield content  
-
-    
-    if not full_response.strip():
-        fallback = "I don't have information about that"
-        full_response = fallback
-        yield fallback
-
-    
-    ChatMessage.objects.create(user=user, role="user", content=question)
-    ChatMessage.objects.create(user=user, role="assistant", content=full_response.strip())
+            timer.tick()
+            yield content.replace("<br>", "\n")
+    timer.finish()
+    record_usage(session.agent)
+
+
+def ask_phi(user, question, conversation_id="default"):
+    with trace("chat"):
+        with span("answer_cache"):
+            cached, embedding = lookup_cached_answer(user, question, conversation_id)
+        if cached:
+            yield cached
+            with span("save"):
+                save_chat_turn(user, question, cached, conversation_id)
+                store_cached_turn(user, conversation_id, question, cached)
+            record_turn(user, conversation_id, question)
+            return
+
+        full_response = ""
+        session = agent_pool.get(user.pk, conversation_id)
+
+        try:
+            with session.lock:
+                for content in stream_agent_run(session, question):
+                    full_response += content
+                    yield content
+        except GeneratorExit:
+            # client went away mid-stream (the WSGI server closes the
+            # generator), keep whatever was already sent
+            if full_response.strip():
+                save_chat_turn(user, question, full_response, conversation_id)
+            raise
+
+        
+        if not full_response.strip():
+            fallback = NO_INFO_ANSWER
+            full_response = fallback
+            yield fallback
+        else:
+            remember_answer(question, embedding, full_response, session.agent)
+
+        
+        with span("save"):
+            save_chat_turn(user, question, full_response, conversation_id)
+        record_turn(user, conversation_id, question)
+
+
+_llm_semaphores = weakref.WeakKeyDictionary()
+
+
+def llm_semaphore():
+    # asyncio primitives belong to one event loop, so keep one per loop
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.CHAT_MAX_INFLIGHT_LLM_CALLS)
+        _llm_semaphores[loop] = semaphore
+    return semaphore
+
+
+asave_chat_turn = database_sync_to_async(save_chat_turn)
+
+
+async def acquire_session(lock, poll=0.02):
+    """
+    Waits for a session's threading.Lock without tying up a thread. Polling
+    keeps the wait cancellable: a client that goes away while queued never
+    ends up owning the lock.
+    """
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(poll)
+
+
+async def aask_phi(user, question, conversation_id="default"):
+    with trace("chat"):
+        with span("answer_cache"):
+            cached, embedding = await database_sync_to_async(lookup_cached_answer)(user, question, conversation_id)
+        if cached:
+            yield cached
+            with span("save"):
+                await asave_chat_turn(user, question, cached, conversation_id)
+                await sync_to_async(store_cached_turn, thread_sensitive=False)(user, conversation_id, question, cached)
+            record_turn(user, conversation_id, question)
+            return
+
+        full_response = ""
+        # building an agent the first time imports phi
+        session = await sync_to_async(agent_pool.get, thread_sensitive=False)(user.pk, conversation_id)
+
+        # the session lock is a threading.Lock shared with the sync path; take
+        # it before the semaphore so a queued turn doesn't hold an LLM slot
+        with span("queue"):
+            await acquire_session(session.lock)
+        stream = None
+        try:
+            async with llm_semaphore():
+                # phi's storage, knowledge search and embedding calls are all
+                # blocking, so the run goes to its own thread, which releases
+                # the session lock once the run is over
+                stream = ThreadedStream(stream_agent_run(session, question), on_finish=session.lock.release)
+                try:
+                    async for content in stream:
+                        full_response += content
+                        yield content
+                finally:
+                    stream.close()
+        except (asyncio.CancelledError, GeneratorExit):
+            # under ASGI a disconnect cancels the response task; the save is
+            # shielded so a second cancel can't drop what was already sent
+            if full_response.strip():
+                await asyncio.shield(asave_chat_turn(user, question, full_response, conversation_id))
+            raise
+        finally:
+            if stream is None:
+                session.lock.release()
+
+        if not full_response.strip():
+            fallback = NO_INFO_ANSWER
+            full_response = fallback
+            yield fallback
+        else:
+            await database_sync_to_async(remember_answer)(question, embedding, full_response, session.agent)
+
+        with span("save"):
+            await asave_chat_turn(user, question, full_response, conversation_id)
+        record_turn(user, conversation_id, question)
+
+
+def warm_up():
+    """
+    Builds the shared chat components and fills the connection pools ahead
+    of the first request, so no user pays for it. Returns the seconds spent
+    per step; a failing step is logged and skipped.
+    """
+    from django.db import connection
+    from .chunking import count_tokens
+    from .db import get_engine
+
+    def sqlalchemy_pool():
+        engine = get_engine()
+        connections = [engine.connect() for _ in range(settings.SQLALCHEMY_ENGINE_OPTIONS.get("pool_size", 1))]
+        for conn in connections:
+            conn.close()
+
+    steps = [
+        ("database", connection.ensure_connection),
+        ("sqlalchemy_pool", sqlalchemy_pool),
+        ("openai_clients", openai_clients),
+        ("knowledge_base", lambda: knowledge_base().vector_db.ensure_text_search()),
+        ("retriever", knowledge_retriever),
+        ("memory_db", memory_db),
+        ("agent_storage", agent_storage),
+        ("answer_cache", answer_cache),
+        ("tokenizer", lambda: count_tokens("warm up")),
+        ("agent", lambda: build_agent(user_id="warmup", session_id="warmup")),
+    ]
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - start
+    logger.info("Chat warm-up took %.2fs: %s", sum(timings.values()),
+                ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings
+
+
+def start_warm_up():
+    """
+    Runs warm_up() on a background thread if CHAT_WARM_UP_ON_STARTUP is set.
+    Called from asgi.py / wsgi.py, so only the web server warms up; manage.py
+    commands such as migrate never load those modules.
+    """
+    if not settings.CHAT_WARM_UP_ON_STARTUP:
+        return
+
+    def run():
+        from django.db import connections
+        try:
+            warm_up()
+        finally:
+            # give the thread's connection back to the pool
+            connections.close_all()
+
+    # off the startup path: the server accepts requests while this runs
+    threading.Thread(target=run, name="chat-warm-up", daemon=True).start()
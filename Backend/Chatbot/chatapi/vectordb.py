@@ -0,0 +1,624 @@
+import re
+import json
+import math
+import time
+import logging
+from django.conf import settings
+from pgvector.sqlalchemy import BIT, HALFVEC, VECTOR
+from sqlalchemy import Column, Computed, Text, bindparam, cast, func, select, text
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR
+from phi.document import Document
+from phi.vectordb.distance import Distance
+from phi.vectordb.pgvector import PgVector2
+from phi.vectordb.pgvector.index import HNSW, Ivfflat
+from .db import get_engine
+from .embedding import embedder, shorten
+from .metrics import percentile
+
+
+logger = logging.getLogger(__name__)
+
+OPERATOR_SUFFIXES = {
+    Distance.cosine: "cosine_ops",
+    Distance.l2: "l2_ops",
+    Distance.max_inner_product: "ip_ops",
+}
+# pgvector refuses to index wider columns than this
+MAX_INDEX_DIMENSIONS = {"vector": 2000, "halfvec": 4000, "bit": 64000}
+
+
+def as_list(embedding):
+    # VECTOR columns come back as numpy arrays, HALFVEC as pgvector HalfVector
+    if embedding is None:
+        return None
+    if hasattr(embedding, "to_list"):
+        return embedding.to_list()
+    return [float(x) for x in embedding]
+
+
+def reciprocal_rank_fusion(rankings, k=60, limit=None):
+    """
+    Merges ranked id lists: every list adds 1 / (k + rank) to an id's
+    score, so ids that rank well in any list (and better, in several) win.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return fused[:limit] if limit else fused
+
+
+def index_config(collection):
+    config = dict(settings.VECTOR_INDEX.get("default", {}))
+    config.update(settings.VECTOR_INDEX.get(collection, {}))
+    return config
+
+
+def build_index(collection):
+    """The phi index description configured for a collection in settings.VECTOR_INDEX."""
+    config = index_config(collection)
+    kind = config.get("type", "hnsw")
+    name = f"{collection}_{kind}_idx".lower()
+    configuration = {"maintenance_work_mem": config.get("maintenance_work_mem", "512MB")}
+    if kind == "hnsw":
+        return HNSW(
+            name=name,
+            m=config.get("m", 16),
+            ef_construction=config.get("ef_construction", 64),
+            ef_search=config.get("ef_search", 40),
+            configuration=configuration,
+        )
+    if kind == "ivfflat":
+        lists = config.get("lists", 0)
+        return Ivfflat(
+            name=name,
+            lists=lists or 1,
+            probes=config.get("probes", 10),
+            dynamic_lists=not lists,
+            configuration=configuration,
+        )
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown vector index type {kind!r} for {collection}")
+
+
+class IndexedPgVector(PgVector2):
+    """
+    PgVector2 that owns its ANN index. phi builds the index once with
+    unquoted names (which misses mixed-case tables like UoK_Data) and pins
+    ef_search/probes; here the index is created and rebuilt concurrently,
+    the search knobs can be overridden per query, and ``exact=True`` runs
+    the same query as a sequential scan for recall checks.
+
+    Embeddings can be stored as ``halfvec`` (half the bytes, pgvector
+    >= 0.7) and indexed through their binary quantization, in which case a
+    search takes ``rescore_factor * limit`` Hamming-distance candidates from
+    the index and orders those by exact distance.
+    """
+
+    def __init__(self, collection, *args, storage="vector", quantization="none", rescore_factor=4,
+                 rebuild_growth=2.0, search_mode="vector", text_search_config="english",
+                 search_candidates=20, rrf_k=60, **kwargs):
+        if storage not in ("vector", "halfvec"):
+            raise ValueError(f"Unknown vector storage {storage!r} for {collection}")
+        if quantization not in ("none", "binary"):
+            raise ValueError(f"Unknown vector quantization {quantization!r} for {collection}")
+        # get_table() runs inside PgVector2.__init__
+        self.storage = storage
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.rebuild_growth = rebuild_growth
+        if search_mode not in ("vector", "text", "hybrid"):
+            raise ValueError(f"Unknown search mode {search_mode!r} for {collection}")
+        self.search_mode = search_mode
+        self.text_search_config = text_search_config
+        self.search_candidates = search_candidates
+        self.rrf_k = rrf_k
+        self._text_search_ready = False
+        super().__init__(collection, *args, **kwargs)
+
+    def get_table(self):
+        table = super().get_table()
+        if self.storage == "halfvec":
+            table.append_column(Column("embedding", HALFVEC(self.dimensions)), replace_existing=True)
+        table.append_column(
+            Column("content_tsv", TSVECTOR, Computed(self.tsvector_sql, persisted=True)),
+            replace_existing=True,
+        )
+        return table
+
+    @property
+    def tsvector_sql(self):
+        return f"to_tsvector('{self.text_search_config}'::regconfig, coalesce(content, ''))"
+
+    @property
+    def text_index_name(self):
+        return f"{self.collection}_content_tsv_idx".lower()
+
+    def create(self):
+        super().create()
+        self.ensure_text_search()
+
+    def ensure_text_search(self):
+        """
+        Adds the generated tsvector column and its GIN index to tables
+        created before hybrid search. Cheap after the first call.
+        """
+        if self._text_search_ready or not self.table_exists():
+            return
+        with self.Session() as sess:
+            with sess.begin():
+                missing = sess.execute(
+                    text(
+                        "SELECT 1 FROM pg_attribute WHERE attrelid = CAST(:table AS regclass) "
+                        "AND attname = 'content_tsv' AND NOT attisdropped"
+                    ),
+                    {"table": self.qualified_name},
+                ).first() is None
+                if missing:
+                    logger.info("Adding full-text search column to %s", self.collection)
+                    sess.execute(text(
+                        f"ALTER TABLE {self.qualified_name} ADD COLUMN content_tsv tsvector "
+                        f"GENERATED ALWAYS AS ({self.tsvector_sql}) STORED"
+                    ))
+        with self.db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.quoted(self.text_index_name)} "
+                f"ON {self.qualified_name} USING gin (content_tsv)"
+            ))
+        self._text_search_ready = True
+
+    @property
+    def column_type(self):
+        return HALFVEC(self.dimensions) if self.storage == "halfvec" else VECTOR(self.dimensions)
+
+    @property
+    def qualified_name(self):
+        return self.db_engine.dialect.identifier_preparer.format_table(self.table)
+
+    def quoted(self, name):
+        return self.db_engine.dialect.identifier_preparer.quote(name)
+
+    def qualified_index_name(self, name):
+        return f"{self.quoted(self.schema)}.{self.quoted(name)}" if self.schema else self.quoted(name)
+
+    # Search
+
+    @property
+    def document_columns(self):
+        return [
+            self.table.c.id,
+            self.table.c.name,
+            self.table.c.meta_data,
+            self.table.c.content,
+            self.table.c.embedding,
+            self.table.c.usage,
+        ]
+
+    def to_document(self, row):
+        return Document(
+            id=row.id,
+            name=row.name,
+            meta_data=row.meta_data,
+            content=row.content,
+            embedder=self.embedder,
+            embedding=as_list(row.embedding),
+            usage=row.usage,
+        )
+
+    def search(self, query, limit=5, filters=None, ef_search=None, probes=None, mode=None):
+        """
+        ``mode`` "vector" is plain nearest-neighbour search, "text" is
+        Postgres full-text search and "hybrid" runs both over
+        ``search_candidates`` rows each and merges them with reciprocal rank
+        fusion, so exact course codes and acronyms surface even when their
+        embedding is not the closest.
+        """
+        mode = mode or self.search_mode
+        embedding = None
+        if mode != "text":
+            embedding = self.embedder.get_embedding(query)
+            if not embedding:
+                logger.error("Error getting embedding for query: %s", query)
+                if mode == "vector":
+                    return []
+
+        try:
+            if mode == "vector":
+                rows = self.nearest(self.document_columns, embedding, limit, filters, ef_search, probes)
+            else:
+                self.ensure_text_search()
+                pool = max(limit, self.search_candidates)
+                rankings = [self.text_ids(query, pool, filters)]
+                if embedding:
+                    rankings.insert(0, self.nearest_ids(embedding, pool, filters, ef_search, probes))
+                rows = self.rows_by_id(reciprocal_rank_fusion(rankings, k=self.rrf_k, limit=limit))
+        except Exception:
+            self.missing_table_or_raise()
+            return []
+
+        results = [self.to_document(row) for row in rows]
+        if self.reranker:
+            results = self.reranker.rerank(query=query, documents=results)
+        return results
+
+    def search_by_embedding(self, embedding, limit=5, filters=None, ef_search=None, probes=None, exact=False):
+        try:
+            rows = self.nearest(self.document_columns, embedding, limit, filters, ef_search, probes, exact)
+        except Exception:
+            self.missing_table_or_raise()
+            return []
+        return [self.to_document(row) for row in rows]
+
+    def missing_table_or_raise(self):
+        """
+        Called from a failed search: an empty collection has no table yet,
+        create it and answer with nothing. Anything else (a query embedding
+        that doesn't match the column's dimensions, say) is re-raised, an
+        empty result would quietly turn every answer into "no information".
+        """
+        if self.table_exists():
+            logger.exception("Error searching %s", self.collection)
+            raise
+        self.create()
+
+    def nearest_ids(self, embedding, limit=5, filters=None, ef_search=None, probes=None, exact=False):
+        rows = self.nearest([self.table.c.id], embedding, limit, filters, ef_search, probes, exact)
+        return [row.id for row in rows]
+
+    def rows_by_id(self, ids):
+        if not ids:
+            return []
+        with self.Session() as sess:
+            rows = {row.id: row for row in sess.execute(
+                select(*self.document_columns).where(self.table.c.id.in_(ids))
+            )}
+        return [rows[id] for id in ids if id in rows]
+
+    def filtered(self, stmt, filters):
+        for key, value in (filters or {}).items():
+            if hasattr(self.table.c, key):
+                stmt = stmt.where(getattr(self.table.c, key) == value)
+        return stmt
+
+    def text_query(self, query):
+        # terms are OR-ed: a question rarely shares every word with the chunk
+        # that answers it, ts_rank_cd then favours chunks matching more of them
+        config = cast(self.text_search_config, REGCONFIG)
+        return func.to_tsquery(config, func.replace(cast(func.plainto_tsquery(config, query), Text), " & ", " | "))
+
+    def text_ids(self, query, limit=5, filters=None):
+        tsquery = self.text_query(query)
+        stmt = self.filtered(select(self.table.c.id).where(self.table.c.content_tsv.op("@@")(tsquery)), filters)
+        stmt = stmt.order_by(func.ts_rank_cd(self.table.c.content_tsv, tsquery).desc()).limit(limit)
+        with self.Session() as sess:
+            return [row.id for row in sess.execute(stmt)]
+
+    def nearest(self, columns, embedding, limit, filters=None, ef_search=None, probes=None, exact=False):
+        stmt = self.filtered(select(*columns), filters)
+        candidates = self.filtered(select(self.table.c.id), filters)
+
+        if self.quantization == "binary" and not exact:
+            # coarse pass over the bit index, then exact distance on the survivors
+            candidates = candidates.order_by(self.hamming_distance_to(embedding)).limit(limit * self.rescore_factor)
+            stmt = stmt.where(self.table.c.id.in_(candidates.scalar_subquery()))
+        stmt = stmt.order_by(self.distance_to(embedding)).limit(limit)
+
+        with self.Session() as sess:
+            with sess.begin():
+                for statement in self.search_settings(limit, ef_search, probes, exact):
+                    sess.execute(text(statement))
+                return sess.execute(stmt).fetchall()
+
+    def distance_to(self, embedding):
+        column = self.table.c.embedding
+        if self.distance == Distance.l2:
+            return column.l2_distance(embedding)
+        if self.distance == Distance.max_inner_product:
+            return column.max_inner_product(embedding)
+        return column.cosine_distance(embedding)
+
+    def quantized(self, value):
+        return cast(func.binary_quantize(value), BIT(self.dimensions))
+
+    def hamming_distance_to(self, embedding):
+        query = cast(bindparam("query_embedding", as_list(embedding), type_=VECTOR(self.dimensions)),
+                     VECTOR(self.dimensions))
+        return self.quantized(self.table.c.embedding).op("<~>")(self.quantized(query))
+
+    def search_settings(self, limit, ef_search=None, probes=None, exact=False):
+        if exact:
+            return ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = off"]
+        if self.quantization == "binary":
+            limit *= self.rescore_factor
+        if isinstance(self.index, HNSW):
+            # an HNSW scan never returns more than ef_search rows
+            ef_search = max(ef_search or self.index.ef_search, limit)
+            return [f"SET LOCAL hnsw.ef_search = {int(ef_search)}"]
+        if isinstance(self.index, Ivfflat):
+            return [f"SET LOCAL ivfflat.probes = {int(probes or self.index.probes)}"]
+        return []
+
+    # Index management
+
+    def ann_indexes(self):
+        """Every HNSW/IVFFlat index on the table (name, method, size, build stats)."""
+        if not self.table_exists():
+            return []
+        stmt = text(
+            "SELECT c.relname AS name, am.amname AS method, i.indisvalid AS valid, "
+            "pg_relation_size(c.oid) AS size, pg_get_indexdef(c.oid) AS definition, "
+            "obj_description(c.oid, 'pg_class') AS comment "
+            "FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_am am ON am.oid = c.relam "
+            "WHERE i.indrelid = CAST(:table AS regclass) AND am.amname IN ('hnsw', 'ivfflat') "
+            "ORDER BY c.relname"
+        )
+        with self.Session() as sess:
+            rows = sess.execute(stmt, {"table": self.qualified_name}).mappings().all()
+        indexes = []
+        for row in rows:
+            info = dict(row)
+            try:
+                info["build"] = json.loads(info.pop("comment") or "{}")
+            except ValueError:
+                info["build"] = {}
+            indexes.append(info)
+        return indexes
+
+    def index_info(self):
+        """The index searches use: the configured one if present, else any valid one."""
+        indexes = self.ann_indexes()
+        named = [info for info in indexes if self.index is not None and info["name"] == self.index.name]
+        valid = [info for info in indexes if info["valid"]]
+        return (named or valid or indexes or [None])[0]
+
+    def table_size(self):
+        with self.Session() as sess:
+            return sess.execute(
+                text("SELECT pg_total_relation_size(CAST(:table AS regclass))"), {"table": self.qualified_name}
+            ).scalar()
+
+    def ivfflat_lists(self, rows):
+        if not self.index.dynamic_lists:
+            return self.index.lists
+        # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) above
+        return max(1, rows // 1000 if rows <= 1000000 else int(math.sqrt(rows)))
+
+    @property
+    def index_kind(self):
+        return "bit" if self.quantization == "binary" else self.storage
+
+    @property
+    def indexable(self):
+        return self.dimensions <= MAX_INDEX_DIMENSIONS[self.index_kind]
+
+    def index_sql(self, name, rows):
+        kind = self.index_kind
+        if self.quantization == "binary":
+            key = f"(binary_quantize(embedding)::bit({self.dimensions})) bit_hamming_ops"
+        else:
+            key = f"embedding {self.storage}_{OPERATOR_SUFFIXES[self.distance]}"
+        if not self.indexable:
+            raise ValueError(
+                f"pgvector cannot index {self.dimensions} dimensions as {kind}; lower EMBEDDING_DIMENSIONS "
+                f"or switch the {self.collection} collection to halfvec storage or binary quantization"
+            )
+        if isinstance(self.index, Ivfflat):
+            method = "ivfflat"
+            options = f"lists = {self.ivfflat_lists(rows)}"
+        else:
+            method = "hnsw"
+            options = f"m = {self.index.m}, ef_construction = {self.index.ef_construction}"
+        return (
+            f"CREATE INDEX CONCURRENTLY {self.quoted(name)} ON {self.qualified_name} "
+            f"USING {method} ({key}) WITH ({options})"
+        )
+
+    def build_index(self):
+        """
+        Builds the configured index next to the current one without blocking
+        writes, then swaps it in. Returns the new index info.
+        """
+        if self.index is None:
+            return None
+        self.create()
+        rows = self.get_count()
+        building = f"{self.index.name}_new"
+        # CREATE INDEX CONCURRENTLY refuses to run inside a transaction
+        with self.db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for key, value in self.index.configuration.items():
+                conn.execute(text(f"SET {key} = '{value}'"))
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.qualified_index_name(building)}"))
+            logger.info("Building %s index on %s (%d rows)", type(self.index).__name__, self.collection, rows)
+            conn.execute(text(self.index_sql(building, rows)))
+
+        with self.Session() as sess:
+            with sess.begin():
+                for info in self.ann_indexes():
+                    if info["name"] != building:
+                        sess.execute(text(f"DROP INDEX IF EXISTS {self.qualified_index_name(info['name'])}"))
+                sess.execute(text(
+                    f"ALTER INDEX {self.qualified_index_name(building)} RENAME TO {self.quoted(self.index.name)}"
+                ))
+                build = json.dumps({"rows": rows})
+                sess.execute(text(f"COMMENT ON INDEX {self.qualified_index_name(self.index.name)} IS '{build}'"))
+        return self.index_info()
+
+    def maintain_index(self):
+        """
+        Called after bulk ingest. Creates the index if it is missing or
+        invalid and rebuilds an IVFFlat index once the table has grown or
+        shrunk by ``rebuild_growth`` since it was built, because its lists
+        are fixed at build time. HNSW is maintained by Postgres on insert.
+        Returns what was done: "created", "rebuilt" or None.
+        """
+        if self.index is None or not self.table_exists():
+            return None
+        if not self.indexable:
+            logger.warning(
+                "%s has %d-dimensional %s embeddings, too wide for an index; searches scan every row",
+                self.collection, self.dimensions, self.index_kind,
+            )
+            return None
+        info = self.index_info()
+        if info is None or not info["valid"]:
+            self.build_index()
+            return "created"
+        method = "ivfflat" if isinstance(self.index, Ivfflat) else "hnsw"
+        quantized = "binary_quantize" in info["definition"]
+        if info["method"] != method or quantized != (self.quantization == "binary"):
+            self.build_index()
+            return "rebuilt"
+        if method == "ivfflat":
+            grown = max(self.get_count(), 1) / max(info["build"].get("rows") or 0, 1)
+            if grown >= self.rebuild_growth or grown <= 1 / self.rebuild_growth:
+                self.build_index()
+                return "rebuilt"
+        return None
+
+    def optimize(self):
+        self.maintain_index()
+
+    # Storage migration
+
+    def stored_type(self):
+        """The embedding column type as Postgres has it, e.g. "vector(1536)"."""
+        with self.Session() as sess:
+            return sess.execute(
+                text(
+                    "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                    "WHERE attrelid = CAST(:table AS regclass) AND attname = 'embedding'"
+                ),
+                {"table": self.qualified_name},
+            ).scalar()
+
+    def reencode(self, batch_size=1000):
+        """
+        Converts stored embeddings to the configured storage type and
+        dimensions without calling the embedding API. text-embedding-3
+        vectors keep their meaning when cut short, so reducing dimensions
+        truncates and re-normalizes each row; growing them is not possible.
+
+        Rows are copied into a new column in batches (so an interrupted run
+        resumes where it stopped) and the columns are swapped at the end.
+        The ANN index is rebuilt afterwards. Stop the ingest worker first.
+        Returns the number of rows converted.
+        """
+        if not self.table_exists():
+            return 0
+        target = f"{self.storage}({self.dimensions})"
+        current = self.stored_type()
+        if current == target:
+            return 0
+        current_dimensions = int(re.search(r"\((\d+)\)", current).group(1))
+        if current_dimensions < self.dimensions:
+            raise ValueError(
+                f"{self.collection} stores {current}; cannot widen to {target} without re-embedding"
+            )
+
+        table = self.qualified_name
+        logger.info("Re-encoding %s from %s to %s", self.collection, current, target)
+        with self.Session() as sess:
+            with sess.begin():
+                # the old index is on the old column type
+                for info in self.ann_indexes():
+                    sess.execute(text(f"DROP INDEX IF EXISTS {self.qualified_index_name(info['name'])}"))
+                sess.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding_reencoded {target}"))
+
+        converted, last_id = 0, ""
+        while True:
+            with self.Session() as sess:
+                with sess.begin():
+                    rows = sess.execute(
+                        text(
+                            f"SELECT id, embedding::text AS embedding FROM {table} "
+                            f"WHERE id > :last_id AND embedding IS NOT NULL AND embedding_reencoded IS NULL "
+                            f"ORDER BY id LIMIT :batch_size"
+                        ),
+                        {"last_id": last_id, "batch_size": batch_size},
+                    ).fetchall()
+                    if not rows:
+                        break
+                    sess.execute(
+                        text(f"UPDATE {table} SET embedding_reencoded = CAST(:embedding AS {target}) WHERE id = :id"),
+                        [
+                            {"id": row.id, "embedding": json.dumps(shorten(json.loads(row.embedding), self.dimensions))}
+                            for row in rows
+                        ],
+                    )
+            converted += len(rows)
+            last_id = rows[-1].id
+
+        with self.Session() as sess:
+            with sess.begin():
+                sess.execute(text(f"ALTER TABLE {table} DROP COLUMN embedding"))
+                sess.execute(text(f"ALTER TABLE {table} RENAME COLUMN embedding_reencoded TO embedding"))
+        logger.info("Re-encoded %d rows of %s", converted, self.collection)
+        self.maintain_index()
+        return converted
+
+
+def build_vector_db(collection=None, **overrides):
+    """
+    The vector store for a collection, shared by the agent and the ingest
+    worker. ``overrides`` replace settings-derived arguments (benchmarks
+    pass their own embedder).
+    """
+    collection = collection or settings.KNOWLEDGE_COLLECTION
+    config = index_config(collection)
+    options = dict(
+        db_engine=get_engine(),
+        embedder=embedder,
+        index=build_index(collection),
+        storage=config.get("storage", "vector"),
+        quantization=config.get("quantization", "none"),
+        rescore_factor=config.get("rescore_factor", 4),
+        rebuild_growth=config.get("rebuild_growth", 2.0),
+        search_mode=settings.KNOWLEDGE_SEARCH_MODE,
+        text_search_config=settings.KNOWLEDGE_TEXT_SEARCH_CONFIG,
+        search_candidates=settings.KNOWLEDGE_SEARCH_CANDIDATES,
+        rrf_k=settings.KNOWLEDGE_RRF_K,
+    )
+    options.update(overrides)
+    return IndexedPgVector(collection=collection, **options)
+
+
+def measure_recall(vector_db, samples=50, k=5, ef_search=None, probes=None):
+    """
+    recall@k of the ANN index against exact search, using stored chunk
+    embeddings as queries, with p50/p95 latency (ms) of both.
+    """
+    with vector_db.Session() as sess:
+        queries = [
+            row.embedding for row in sess.execute(
+                select(vector_db.table.c.embedding)
+                .where(vector_db.table.c.embedding.isnot(None))
+                .order_by(func.random())
+                .limit(samples)
+            )
+        ]
+
+    hits, total, ann_ms, exact_ms = 0, 0, [], []
+    for embedding in queries:
+        start = time.perf_counter()
+        expected = vector_db.nearest_ids(embedding, k, exact=True)
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        found = vector_db.nearest_ids(embedding, k, ef_search=ef_search, probes=probes)
+        ann_ms.append((time.perf_counter() - start) * 1000)
+
+        hits += len(set(expected) & set(found))
+        total += len(expected)
+    return {
+        "queries": len(queries),
+        "k": k,
+        "recall": hits / total if total else 1.0,
+        "ann_p50_ms": percentile(ann_ms, 50),
+        "ann_p95_ms": percentile(ann_ms, 95),
+        "exact_p50_ms": percentile(exact_ms, 50),
+        "exact_p95_ms": percentile(exact_ms, 95),
+    }
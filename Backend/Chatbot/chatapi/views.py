@@ -1,48 +1,222 @@
-from datetime import timedelta
+import json
+import hmac
+import hashlib
+import logging
+from datetime import datetime,time
 from django.db import transaction
+from django.db.models import Count,Max,OuterRef,Subquery
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse,JsonResponse,StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control,patch_vary_headers
+from django.utils.dateparse import parse_date,parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework import status,permissions
 from rest_framework.parsers import MultiPartParser,FormParser
 from rest_framework.response import Response
-from .models import UploadRecord,ChatMessage
-from .embedding import openai_embedder
-from phi.knowledge.pdf import PDFKnowledgeBase
-from phi.vectordb.pgvector import PgVector2
-from .serializer import ChatMessageSerializer,UploadSerializer
-from .utils import ask_phi,SafePDFReader
-from phi.document.chunking.document import DocumentChunking
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import AuthenticationFailed,NotFound
+from user.authentication import CachedJWTAuthentication
+from .models import UploadRecord,ChatMessage,Conversation,IngestJob
+from .serializer import ChatMessageSerializer,ConversationSerializer,UploadSerializer,IngestJobSerializer
+from .pagination import ChatHistoryPagination,ConversationPagination,UploadPagination
+from .renderers import EventStreamRenderer,sse_event
+from .utils import ask_phi,aask_phi
+from .db import database_sync_to_async
+from .jobs import enqueue_ingest
+from .ratelimit import ChatThrottle,aadmit,after_admission
+from .metrics import render as render_metrics,span,trace
 
 
 
+logger = logging.getLogger(__name__)
+
+
+def sse_events(answer):
+    full_response = ""
+    try:
+        for chunk in answer:
+            full_response += chunk
+            yield sse_event("chunk", {"content": chunk})
+    except Exception as e:
+        logger.exception("Chat stream failed")
+        yield sse_event("error", {"error": str(e)})
+        return
+
+    yield sse_event("done", {"response": full_response.strip()})
+
+
+async def asse_events(answer):
+    full_response = ""
+    try:
+        async for chunk in answer:
+            full_response += chunk
+            yield sse_event("chunk", {"content": chunk})
+    except Exception as e:
+        logger.exception("Async chat stream failed")
+        yield sse_event("error", {"error": str(e)})
+        return
+
+    yield sse_event("done", {"response": full_response.strip()})
+
+
+def event_stream(events):
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response['Cache-Control'] = 'no-cache'
+    # stop nginx / proxies from buffering the whole answer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def indexed_upload(content_hash):
+    """
+    The earlier upload of this exact file, if it is what the index holds
+    for its name: a newer upload under the same name replaced its chunks.
+    """
+    latest = UploadRecord.objects.filter(name=OuterRef('name')).order_by('-uploaded_at', '-id').values('pk')[:1]
+    return UploadRecord.objects.filter(
+        content_hash=content_hash,
+        jobs__status__in=[IngestJob.QUEUED, IngestJob.RUNNING, IngestJob.DONE],
+        pk=Subquery(latest),
+    ).first()
+
+
+CONVERSATION_ID_MAX_LENGTH = Conversation._meta.get_field('key').max_length
+
+
+def conversation_id_error(conversation_id):
+    # checked before the model is called, the id is only stored afterwards
+    if not isinstance(conversation_id, str):
+        return 'conversation_id must be a string'
+    if len(conversation_id) > CONVERSATION_ID_MAX_LENGTH:
+        return f'conversation_id must be at most {CONVERSATION_ID_MAX_LENGTH} characters'
+    return None
+
+
+def wants_stream(request):
+    if str(request.data.get('stream', '')).lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
 
 # Create your views here.
 
 
 class ChatBotAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ChatThrottle]
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [EventStreamRenderer]
     def post(self, request):
         prompt = request.data.get('prompt')
 
         if not prompt:
             return Response({'error':'prompt is required'},status=status.HTTP_400_BAD_REQUEST)
+
+        conversation_id = request.data.get('conversation_id') or 'default'
+        error = conversation_id_error(conversation_id)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        if wants_stream(request):
+            return self.stream_response(request, prompt, conversation_id)
         
         try:
             full_response = ""
-            for chunk in ask_phi(request.user, prompt):
+            for chunk in ask_phi(request.user, prompt, conversation_id):
                 chunk = chunk.replace("<br>", "\n")
                 full_response += chunk
 
             return Response({"response": full_response.strip()})
         except Exception as e:
             return Response({'error': str(e)},status=status.HTTP_400_BAD_REQUEST)
+
+    def streams_async(self, request):
+        # under ASGI Django drains a sync iterator completely before
+        # sending anything, so streams come from the async path instead
+        return isinstance(request._request, ASGIRequest) and wants_stream(request)
+
+    def stream_response(self, request, prompt, conversation_id):
+        if self.streams_async(request):
+            events = asse_events(aask_phi(request.user, prompt, conversation_id))
+            return event_stream(after_admission(getattr(request, 'admission_wait', 0.0), events))
+        return event_stream(sse_events(ask_phi(request.user, prompt, conversation_id)))
         
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatBotView(View):
+    # Native async twin of ChatBotAPIView for ASGI deployments. DRF views
+    # are sync only, so auth and parsing are done by hand here.
+    authentication = CachedJWTAuthentication()
+
+    async def authenticate(self, request):
+        try:
+            result = await database_sync_to_async(self.authentication.authenticate)(request)
+        except AuthenticationFailed:
+            return None
+        if result is None:
+            return None
+        user, _ = result
+        return user if user.is_active else None
+
+    async def post(self, request):
+        user = await self.authenticate(request)
+        if user is None:
+            return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        retry_after = await aadmit(user.pk)
+        if retry_after is not None:
+            response = JsonResponse({'error': f'Request was throttled. Expected available in {retry_after} seconds.'},
+                                    status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(retry_after)
+            return response
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+        prompt = data.get('prompt')
+        if not prompt:
+            return JsonResponse({'error':'prompt is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        conversation_id = data.get('conversation_id') or 'default'
+        error = conversation_id_error(conversation_id)
+        if error:
+            return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = str(data.get('stream', '')).lower() in ('1', 'true', 'yes') or \
+            'text/event-stream' in request.headers.get('Accept', '')
+        if stream:
+            return self.stream_response(user, prompt, conversation_id)
+
+        try:
+            full_response = ""
+            async for chunk in aask_phi(user, prompt, conversation_id):
+                full_response += chunk
+            return JsonResponse({"response": full_response.strip()})
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def stream_response(self, user, prompt, conversation_id):
+        return event_stream(asse_events(aask_phi(user, prompt, conversation_id)))
+
                     
 class UploadFileView(APIView):
     permission_classes = [permissions.IsAdminUser]
     parser_classes = [MultiPartParser,FormParser]
 
     def post(self, request):
+        with trace("upload"):
+            return self.upload(request)
+
+    def upload(self, request):
         file = request.FILES.get("file")
 
         if not file:
@@ -51,76 +225,169 @@ class UploadFileView(APIView):
         if not file.name.lower().endswith(".pdf"):
             return Response({"error": "Only PDF files allowed"}, status=status.HTTP_400_BAD_REQUEST)
 
+        # chatapi.ingest pulls in phi and pypdf, only uploads need it
+        from .ingest import file_fingerprint
+
+        with span("fingerprint"):
+            content_hash = file_fingerprint(file)
+        existing = indexed_upload(content_hash)
+        if existing is not None:
+            return Response(
+                {
+                    "message": "PDF already indexed, nothing to do",
+                    "file": existing.name,
+                },
+                status=status.HTTP_200_OK,
+            )
+
         try:
-            with transaction.atomic():
-                pdf = UploadRecord(
+            with span("store"), transaction.atomic():
+                pdf = UploadRecord.objects.create(
                             file=file,
                             name=file.name,
                             uploaded_by=request.user,
+                            content_hash=content_hash,
                         )
-
-
-        
-                pdf_knowledge_base = PDFKnowledgeBase(
-                    path=pdf.file.path,
-                    vector_db=PgVector2(
-                        collection="UoK_Data",
-                        db_url="postgresql+psycopg://ai:ai@localhost:5532/ai",
-                        embedder=openai_embedder
-                        
-                    ),
-                    reader=SafePDFReader(
-                        chunk=True,
-                        chunking_strategy = DocumentChunking(chunk_size=5000, overlap=150)),
-                    )
-                
-    
-                 # Re-index knowledge base
-                pdf_knowledge_base.load()
-
-                pdf.save()
+                # parsing and embedding happen in the ingest_worker process
+                job = enqueue_ingest(pdf)
         
         except Exception as e:
             return Response({'error': f"Failed to process PDF: {str(e)}"},status=status.HTTP_400_BAD_REQUEST)
         
         return Response(
             {
-                "message": "PDF uploaded and indexed successfully",
+                "message": "PDF uploaded, indexing queued",
                 "file": pdf.name,
+                "job_id": job.pk,
+                "status_url": reverse('ingest_job_status', args=[job.pk], request=request),
             },
-            status=status.HTTP_201_CREATED,
+            status=status.HTTP_202_ACCEPTED,
         )
 
 
+class IngestJobStatusView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    def get(self, request, job_id):
+        job = IngestJob.objects.select_related('record').filter(pk=job_id).first()
+        if job is None:
+            return Response({'error': 'job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = IngestJobSerializer(job)
+        return Response({'data': serializer.data}, status=status.HTTP_200_OK)
+
+
+
+class MetricsView(View):
+    # Prometheus scrape target, only served once METRICS_TOKEN is set
+    def get(self, request):
+        if not settings.METRICS_TOKEN:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def parse_moment(value, end_of_day=False):
+    """ISO date or datetime from a query param; a bare date covers the whole day."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'invalid date {value!r}')
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_uploads(params):
+    """Upload records narrowed by ?uploaded_by=<user id>&uploaded_after=&uploaded_before=."""
+    records = UploadRecord.objects.select_related('uploaded_by')
+    uploaded_by = params.get('uploaded_by')
+    if uploaded_by:
+        if not uploaded_by.isdigit():
+            raise ValueError(f'invalid uploaded_by {uploaded_by!r}')
+        records = records.filter(uploaded_by_id=int(uploaded_by))
+    if params.get('uploaded_after'):
+        records = records.filter(uploaded_at__gte=parse_moment(params['uploaded_after']))
+    if params.get('uploaded_before'):
+        records = records.filter(uploaded_at__lte=parse_moment(params['uploaded_before'], end_of_day=True))
+    return records
+
+
+def uploads_etag(request):
+    # records are only ever added or deleted, so count + newest row identify
+    # the list; the query string covers filters, cursor and page size. The
+    # uploaders' updated_at and count cover admin_name: a rename saves the
+    # user, a deleted user leaves its records without an uploader
+    try:
+        records = filter_uploads(request.GET)
+    except ValueError:
+        return None
+    stats = records.aggregate(count=Count('id'), last_id=Max('id'), latest=Max('uploaded_at'),
+                              uploaders=Count('uploaded_by'), uploader_changed=Max('uploaded_by__updated_at'))
+    key = ":".join(str(stats[name]) for name in ('count', 'last_id', 'latest', 'uploaders', 'uploader_changed'))
+    key = f"{key}:{request.GET.urlencode()}"
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
 
 class UploadedDataListView(APIView):
     permission_classes = [permissions.IsAdminUser]
-    def get(self, request):
-        
-        records = UploadRecord.objects.all().order_by('-uploaded_at')
+    pagination_class = UploadPagination
 
-        serializer =  UploadSerializer(records,many=True)
+    @method_decorator(condition(etag_func=uploads_etag))
+    def get(self, request):
+        try:
+            records = filter_uploads(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({'message':serializer.data}, status=status.HTTP_200_OK)
-     
+        paginator = self.pagination_class()
+        try:
+            page = paginator.paginate_queryset(records, request, view=self)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = UploadSerializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        # always revalidate, a repeat load with If-None-Match costs a 304
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
 
 
 
 
 class GetChatDataView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatHistoryPagination
+
+    def get(self, request):
+        conversation_id = request.query_params.get('conversation_id', 'default')
+        conversation = Conversation.objects.filter(user=request.user, key=conversation_id).first()
+        chat = ChatMessage.objects.filter(user=request.user, conversation=conversation)
+        if conversation is None:
+            chat = chat.none()
+
+        paginator = self.pagination_class()
+        try:
+            page = paginator.paginate_queryset(chat, request, view=self)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ChatMessageSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ConversationListView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ConversationPagination
+
     def get(self, request):
-        last_msg = timezone.now() - timedelta(minutes=5)
+        conversations = Conversation.objects.filter(user=request.user)
+        paginator = self.pagination_class()
         try:
-            chat = ChatMessage.objects.filter(
-                user=request.user,
-                timestemp__gte = last_msg,
-                ).order_by('timestemp')
-            
-           
-            serializer = ChatMessageSerializer(chat, many=True)
-            return Response({'data':serializer.data},status=status.HTTP_200_OK)
-        
-        except Exception as e:
-            return Response({'error':str(e)},status=status.HTTP_400_BAD_REQUEST)
+            page = paginator.paginate_queryset(conversations, request, view=self)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ConversationSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
         
\ No newline at end of file
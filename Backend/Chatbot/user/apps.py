@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .authentication import forget_user
+        from .models import User
+        post_save.connect(forget_user, sender=User, dispatch_uid='user_cache_save')
+        post_delete.connect(forget_user, sender=User, dispatch_uid='user_cache_delete')
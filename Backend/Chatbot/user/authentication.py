@@ -0,0 +1,127 @@
+import copy
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class TTLCache:
+    """Small thread-safe LRU whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Per process, so a change made by another worker is only seen here once the
+# entry expires; keep AUTH_USER_CACHE_SECONDS short.
+user_cache = TTLCache(settings.AUTH_USER_CACHE_SECONDS, settings.AUTH_USER_CACHE_SIZE)
+credential_cache = TTLCache(settings.AUTH_USER_CACHE_SECONDS, settings.AUTH_USER_CACHE_SIZE)
+
+
+def forget_user(sender, instance, **kwargs):
+    """post_save / post_delete receiver for the user model."""
+    user_cache.discard(str(instance.pk))
+
+
+def cached_user(user_id, load):
+    """The user with ``user_id`` from the cache, or ``load()`` and cache it."""
+    key = str(user_id)
+    user = user_cache.get(key)
+    if user is None:
+        user = load()
+        if user.is_active:
+            user_cache.set(key, user)
+    # every request gets its own instance, views may set attributes on it
+    return copy.copy(user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through ``user_cache``
+    instead of a query per request. Signature and expiry are still checked
+    on every request; the cached row is dropped whenever the user is saved
+    or deleted.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken("Token contained no recognizable user identification") from e
+
+        user = cached_user(user_id, lambda: super(CachedJWTAuthentication, self).get_user(validated_token))
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and \
+                validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise exceptions.AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication that only runs the password hasher the first time a
+    username/password pair is seen. Verified pairs are remembered as an HMAC
+    together with the password hash they matched, so changing the password
+    (or deactivating the user) invalidates them.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = hmac.new(settings.SECRET_KEY.encode(), f"{userid}\0{password}".encode(), hashlib.sha256).hexdigest()
+        verified = credential_cache.get(key)
+        if verified is not None:
+            user_id, password_hash = verified
+            model = get_user_model()
+            try:
+                user = cached_user(user_id, lambda: model.objects.get(pk=user_id))
+            except model.DoesNotExist:
+                user = None
+            if user is not None and user.is_active and user.password == password_hash:
+                return (user, None)
+            credential_cache.discard(key)
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        credential_cache.set(key, (user.pk, user.password))
+        user_cache.set(str(user.pk), user)
+        return (copy.copy(user), auth)
@@ -0,0 +1,144 @@
+import re
+import time
+import logging
+import threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from google.auth import jwt
+
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+
+class CertificateFetchError(Exception):
+    """Google's signing certificates could not be fetched and none are cached."""
+
+
+def max_age(headers, default):
+    """Seconds a response may be cached for, from Cache-Control max-age minus Age."""
+    match = re.search(r"max-age=(\d+)", headers.get("Cache-Control", ""))
+    if not match:
+        return default
+    try:
+        age = int(headers.get("Age", 0))
+    except ValueError:
+        age = 0
+    return max(0, int(match.group(1)) - age)
+
+
+class GoogleCertificates:
+    """
+    Google's ID-token signing certificates (``{key id: PEM}``), cached for
+    as long as the response's Cache-Control allows. Once less than
+    ``refresh_margin`` seconds are left, a background thread fetches the next
+    set while requests keep using the current one; only the very first fetch
+    (or one after the certificates expired) happens on the request path.
+    A token signed with an unknown key id forces a refresh, at most once per
+    ``min_refresh_interval`` seconds.
+    """
+
+    def __init__(self, url, session=None, timeout=5, refresh_margin=300, default_max_age=300,
+                 min_refresh_interval=30):
+        self.url = url
+        self.session = session or pooled_session()
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self._certs = None
+        self._expires = 0.0
+        self._fetched = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        now = time.monotonic()
+        if self._certs is None or now >= self._expires:
+            with self._lock:
+                if self._certs is None or time.monotonic() >= self._expires:
+                    self._fetch()
+        elif now >= self._expires - self.refresh_margin:
+            self._refresh_in_background()
+        return self._certs
+
+    def refresh_for_key(self, key_id):
+        """Refetches when ``key_id`` is unknown, e.g. right after Google rotated its keys."""
+        with self._lock:
+            if key_id not in (self._certs or {}) and time.monotonic() - self._fetched >= self.min_refresh_interval:
+                self._fetch()
+        return self._certs
+
+    def _fetch(self):
+        try:
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            certs = response.json()
+        except Exception as e:
+            self._fetched = time.monotonic()
+            if self._certs is None:
+                raise CertificateFetchError(f"Could not fetch Google certificates: {e}") from e
+            # keep verifying with the old set, try again shortly
+            logger.warning("Refreshing Google certificates failed, keeping the cached ones: %s", e)
+            self._expires = max(self._expires, time.monotonic() + self.min_refresh_interval)
+            return
+        self._certs = certs
+        self._fetched = time.monotonic()
+        self._expires = self._fetched + max_age(response.headers, self.default_max_age)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                with self._lock:
+                    self._fetch()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name="google-certs-refresh", daemon=True).start()
+
+
+def pooled_session(pool_size=10):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens locally against the cached certificates."""
+
+    def __init__(self, certificates, audience=None, clock_skew=10):
+        self.certificates = certificates
+        self.audience = audience
+        self.clock_skew = clock_skew
+
+    def verify(self, token):
+        """The token's claims; raises ValueError for invalid, expired or foreign tokens."""
+        if not self.audience:
+            # without a client id any Google app's tokens would be accepted
+            raise ImproperlyConfigured("GOOGLE_CLIENT_ID is not set, Google sign-in is disabled")
+        key_id = jwt.decode_header(token).get("kid")
+        certs = self.certificates.get()
+        if key_id not in certs:
+            certs = self.certificates.refresh_for_key(key_id)
+        claims = jwt.decode(token, certs=certs, audience=self.audience, clock_skew_in_seconds=self.clock_skew)
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer. 'iss' should be one of {GOOGLE_ISSUERS}, got {claims.get('iss')!r}")
+        return claims
+
+
+google_verifier = GoogleTokenVerifier(
+    GoogleCertificates(settings.GOOGLE_CERTS_URL, refresh_margin=settings.GOOGLE_CERTS_REFRESH_MARGIN),
+    audience=settings.GOOGLE_CLIENT_ID,
+    clock_skew=settings.GOOGLE_CLOCK_SKEW_SECONDS,
+)
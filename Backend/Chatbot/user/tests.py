@@ -1,3 +1,142 @@
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APITestCase
+from .authentication import TTLCache, cached_user, user_cache
+from .google_auth import CertificateFetchError, GoogleCertificates, GoogleTokenVerifier, google_verifier, max_age
 
-# Create your tests here.
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = 0.0
+        patcher = mock.patch("user.authentication.time.monotonic", lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=60, max_entries=10)
+        cache.set("a", 1)
+        self.clock = 59
+        self.assertEqual(cache.get("a"), 1)
+        self.clock = 61
+        self.assertIsNone(cache.get("a"))
+
+    def test_least_recently_used_goes_first(self):
+        cache = TTLCache(ttl=60, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_discard_and_disabled(self):
+        cache = TTLCache(ttl=60, max_entries=10)
+        cache.set("a", 1)
+        cache.discard("a")
+        cache.discard("missing")
+        self.assertIsNone(cache.get("a"))
+        for disabled in (TTLCache(ttl=0, max_entries=10), TTLCache(ttl=60, max_entries=0)):
+            disabled.set("a", 1)
+            self.assertIsNone(disabled.get("a"))
+
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = get_user_model().objects.create_user(email="student@example.com", password="x", username="student")
+
+    def test_loaded_once_and_copied(self):
+        load = mock.Mock(return_value=self.user)
+        first = cached_user(self.user.pk, load)
+        second = cached_user(self.user.pk, load)
+        load.assert_called_once()
+        self.assertEqual(first.pk, self.user.pk)
+        self.assertIsNot(first, second)
+
+    def test_saving_the_user_drops_the_entry(self):
+        cached_user(self.user.pk, lambda: self.user)
+        self.user.save()
+        self.assertIsNone(user_cache.get(str(self.user.pk)))
+
+
+
+class MaxAgeTests(SimpleTestCase):
+    def test_max_age(self):
+        self.assertEqual(max_age({"Cache-Control": "public, max-age=19800, must-revalidate"}, 300), 19800)
+        self.assertEqual(max_age({"Cache-Control": "max-age=100", "Age": "30"}, 300), 70)
+        self.assertEqual(max_age({"Cache-Control": "max-age=100", "Age": "500"}, 300), 0)
+        self.assertEqual(max_age({"Cache-Control": "max-age=100", "Age": "soon"}, 300), 100)
+        self.assertEqual(max_age({"Cache-Control": "no-cache"}, 300), 300)
+        self.assertEqual(max_age({}, 300), 300)
+
+
+
+class GoogleCertificatesTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch("user.google_auth.time.monotonic", lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session = mock.Mock()
+
+    def respond(self, certs, max_age=600):
+        response = mock.Mock(headers={"Cache-Control": f"max-age={max_age}"})
+        response.json.return_value = certs
+        self.session.get.return_value = response
+        self.session.get.side_effect = None
+
+    def certificates(self, **kwargs):
+        return GoogleCertificates("https://example.com/certs", session=self.session, **kwargs)
+
+    def test_cached_until_expiry(self):
+        certificates = self.certificates(refresh_margin=0)
+        self.respond({"k1": "pem1"})
+        self.assertEqual(certificates.get(), {"k1": "pem1"})
+        self.clock += 599
+        certificates.get()
+        self.assertEqual(self.session.get.call_count, 1)
+        self.respond({"k2": "pem2"})
+        self.clock += 2
+        self.assertEqual(certificates.get(), {"k2": "pem2"})
+
+    def test_failed_refresh_keeps_the_old_certificates(self):
+        certificates = self.certificates(refresh_margin=0)
+        self.respond({"k1": "pem1"})
+        certificates.get()
+        self.clock += 601
+        self.session.get.side_effect = OSError("unreachable")
+        with self.assertLogs("user.google_auth", "WARNING"):
+            self.assertEqual(certificates.get(), {"k1": "pem1"})
+
+    def test_first_fetch_failing_raises(self):
+        self.session.get.side_effect = OSError("unreachable")
+        with self.assertRaises(CertificateFetchError):
+            self.certificates().get()
+
+    def test_unknown_key_refetches_at_most_once_per_interval(self):
+        certificates = self.certificates(min_refresh_interval=30)
+        self.respond({"k1": "pem1"})
+        certificates.get()
+        self.clock += 31
+        self.respond({"k1": "pem1", "k2": "pem2"})
+        self.assertIn("k2", certificates.refresh_for_key("k2"))
+        certificates.refresh_for_key("k3")
+        self.assertEqual(self.session.get.call_count, 2)
+
+
+
+class GoogleAudienceTests(APITestCase):
+    def test_no_client_id_rejects_every_token(self):
+        certificates = mock.Mock()
+        with self.assertRaises(ImproperlyConfigured):
+            GoogleTokenVerifier(certificates, audience="").verify("any.token.here")
+        certificates.get.assert_not_called()
+
+    def test_login_is_refused_without_a_client_id(self):
+        with mock.patch.object(google_verifier, "audience", ""), self.assertLogs("user.views", "ERROR"):
+            response = self.client.post("/user/google/login/", {"id_token": "any.token.here"}, format="json")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(get_user_model().objects.exists())
@@ -1,13 +1,16 @@
 
+import logging
 from user.serializer import LoginSerializer, UserProfileSerializer,GoogleLoginSerializer
 from django.contrib.auth import authenticate
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import permissions,status
 from .models import User
-from google.auth.transport import requests
-from google.oauth2 import id_token
-import os
+from .google_auth import CertificateFetchError, google_verifier
+
+
+logger = logging.getLogger(__name__)
 
 
 # Create your views here.
@@ -22,9 +25,7 @@ class GoogleLoginView(APIView):
         google_token = serializer.validated_data['id_token']
 
         try:
-            id_info = id_token.verify_oauth2_token(
-                google_token, requests.Request(), os.getenv('VITE_GOOGLE_CLIENT_ID')
-            )
+            id_info = google_verifier.verify(google_token)
 
             email = id_info.get('email')
             username = id_info.get('name')
@@ -33,6 +34,11 @@ class GoogleLoginView(APIView):
 
         except ValueError:
             return Response({"error": "Invalid Google token"}, status=status.HTTP_401_UNAUTHORIZED)
+        except CertificateFetchError:
+            return Response({"error": "Google sign-in is unavailable, try again later"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except ImproperlyConfigured as e:
+            logger.error("%s", e)
+            return Response({"error": "Google sign-in is not available"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         
         try:
             user = User.objects.get(email=email)